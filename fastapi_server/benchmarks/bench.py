@@ -0,0 +1,163 @@
+"""Micro-benchmarks for matching, search, category listing and cart operations.
+
+Usage (from fastapi_server/):
+    python -m benchmarks.bench [--rows 10k] [--seed 0] [--repeat 3] [--reference] [--output FILE]
+
+Runs against a generated catalog and a scratch database, never the
+working products.db, and writes a JSON result file under
+benchmarks/results/ (compare two with ``python -m benchmarks.compare``).
+"""
+import argparse
+import time
+
+from benchmarks.common import measure, prepare_environment, print_table, summarize, write_results
+from benchmarks.generate_catalog import parse_size
+
+EXTRA_INGREDIENTS = ["green chilli", "basmati rice", "ghee", "toor dal", "curry leaves", "cardamom", "xyz"]
+SEARCH_QUERIES = ["onion", "oni", "basmati rice", "tata", "masala", "fresh paneer", "chilli powder", "zzz"]
+CART_ITEMS = 50
+
+
+def product_list_benchmarks(storage, repeat):
+    """Full product list: loading and encoding timed separately, then the HTTP cache.
+
+    ``products.all_load_*`` read the table as ORM objects (what the pydantic
+    path needs) and as the plain rows storage returns. The encode benchmarks
+    start from already loaded products, so they time only the encoding:
+    pydantic validate-and-dump, pre-encoded bytes from a warm cache, and the
+    same from an empty one.
+    """
+    from typing import List
+
+    from pydantic import TypeAdapter
+    from starlette.testclient import TestClient
+
+    from main import app
+    from models import Product, ProductDB
+    from serialization import ProductPayloads, get_product_payloads
+    from storage import SessionLocal
+
+    def load_orm():
+        with SessionLocal() as session:
+            return session.query(ProductDB).all()
+
+    product_list = TypeAdapter(List[Product])
+    orm_products = load_orm()
+    rows = storage.get_all_products()
+    payloads = get_product_payloads()
+    payloads.encode_rows(rows)
+    results = {
+        "products.all_load_orm": summarize(measure(load_orm, [()], repeat)),
+        "products.all_load_rows": summarize(measure(storage.get_all_products, [()], repeat)),
+        "products.all_encode_pydantic": summarize(measure(
+            lambda: product_list.dump_json([Product.model_validate(p) for p in orm_products]), [()], repeat,
+        )),
+        "products.all_encode_fast": summarize(measure(lambda: payloads.encode_rows(rows), [()], repeat)),
+        "products.all_encode_fast_cold": summarize(measure(
+            lambda: ProductPayloads(None).encode_rows(rows), [()], repeat,
+        )),
+    }
+    client = TestClient(app)
+    etag = client.get("/api/products").headers["ETag"]
+    identity = {"Accept-Encoding": "identity"}
+    results["http.products_all_cached"] = summarize(
+        measure(lambda: client.get("/api/products", headers=identity), [()], repeat)
+    )
+    results["http.products_all_gzip"] = summarize(
+        measure(lambda: client.get("/api/products", headers={"Accept-Encoding": "gzip"}), [()], repeat)
+    )
+    results["http.products_all_304"] = summarize(
+        measure(lambda: client.get("/api/products", headers={**identity, "If-None-Match": etag}), [()], repeat)
+    )
+    return results
+
+
+def run(rows, seed=0, repeat=3, reference=False, catalog=None):
+    workdir = prepare_environment(rows, seed, catalog=catalog)
+    results = {}
+
+    started = time.perf_counter()
+    from storage import get_storage
+    storage = get_storage()  # imports the catalog into the scratch DB
+    results["startup.storage_init"] = summarize([time.perf_counter() - started])
+
+    import chat
+    from matching import MatchingEngine, build_matching_engine, get_ingredient_synonyms
+
+    snapshot = chat.get_catalog()
+    results["matching.engine_build"] = summarize(
+        measure(lambda: build_matching_engine(snapshot.products, version=snapshot.version), [()])
+    )
+    results["matching.engine_build_python"] = summarize(
+        measure(lambda: MatchingEngine(snapshot.products, version=snapshot.version), [()])
+    )
+    engine = chat.get_matching_engine()
+    ingredients = list(get_ingredient_synonyms()) + EXTRA_INGREDIENTS
+    ingredient_args = [(ingredient,) for ingredient in ingredients]
+    results["matching.engine_match"] = summarize(measure(engine.match, ingredient_args, repeat))
+    python_engine = MatchingEngine(snapshot.products, version=snapshot.version)
+    results["matching.engine_match_python"] = summarize(measure(python_engine.match, ingredient_args, repeat))
+    if reference:
+        products = chat.get_all_products()
+        results["matching.reference"] = summarize(
+            measure(lambda ingredient: chat.smart_ingredient_matching(ingredient, products), ingredient_args)
+        )
+    # First pass fills the materialized match store, later passes are lookups
+    results["matching.match_products_cold"] = summarize(
+        measure(lambda ingredient: chat.match_products([ingredient]), ingredient_args)
+    )
+    results["matching.match_products_warm"] = summarize(
+        measure(lambda ingredient: chat.match_products([ingredient]), ingredient_args, repeat)
+    )
+
+    query_args = [(query,) for query in SEARCH_QUERIES]
+    for mode in ("fts", "like"):
+        results[f"search.{mode}"] = summarize(
+            measure(lambda query: storage.search_products(query, mode=mode), query_args, repeat)
+        )
+        results[f"search.{mode}_limit50"] = summarize(
+            measure(lambda query: storage.search_products(query, limit=50, mode=mode), query_args, repeat)
+        )
+
+    category_args = [(category,) for category in sorted({product.category for product in snapshot.products})]
+    results["category.full"] = summarize(measure(storage.get_products_by_category, category_args, repeat))
+    results["category.page100"] = summarize(
+        measure(lambda category: storage.get_products_page(100, category=category), category_args, repeat)
+    )
+    results["category.stream"] = summarize(
+        measure(lambda category: sum(1 for _ in storage.iter_products(category=category)), category_args, repeat)
+    )
+    results.update(product_list_benchmarks(storage, repeat))
+
+    product_ids = [(product.id,) for product in snapshot.products[:CART_ITEMS]]
+    results["cart.add"] = summarize(measure(lambda product_id: storage.add_to_cart(product_id, 1), product_ids))
+    results["cart.get"] = summarize(measure(storage.get_cart_items, [()] * CART_ITEMS))
+    results["cart.update"] = summarize(measure(lambda product_id: storage.update_cart_item(product_id, 3), product_ids))
+    results["cart.remove"] = summarize(measure(storage.remove_from_cart, product_ids))
+    operations = [{"op": "add", "product_id": product_id, "quantity": 1} for (product_id,) in product_ids]
+    removals = [{"op": "remove", "product_id": product_id} for (product_id,) in product_ids]
+    results["cart.batch50"] = summarize(
+        measure(lambda: (storage.apply_cart_operations(operations), storage.apply_cart_operations(removals)), [()] * repeat)
+    )
+
+    meta = {"rows": len(snapshot), "seed": seed, "repeat": repeat, "workdir": str(workdir)}
+    return meta, results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Run the HackTheRecipe micro-benchmarks.")
+    parser.add_argument("--rows", default="10k", help="synthetic catalog size: 10k, 100k, 1m or a number")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--repeat", type=int, default=3)
+    parser.add_argument("--catalog", help="benchmark an existing catalog CSV instead of a generated one")
+    parser.add_argument("--reference", action="store_true", help="also time the pure-Python reference matcher")
+    parser.add_argument("--output", help="result JSON path")
+    args = parser.parse_args(argv)
+
+    meta, results = run(parse_size(args.rows), args.seed, args.repeat, args.reference, args.catalog)
+    print_table(results)
+    print("Results written to", write_results("bench", meta, results, args.output))
+
+
+if __name__ == "__main__":
+    main()
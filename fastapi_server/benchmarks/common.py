@@ -0,0 +1,105 @@
+import json
+import os
+import platform
+import subprocess
+import sys
+import tempfile
+import time
+from pathlib import Path
+
+SERVER_DIR = Path(__file__).resolve().parent.parent
+RESULTS_DIR = Path(__file__).resolve().parent / "results"
+
+
+def percentile(sorted_samples, q):
+    # Nearest-rank percentile; samples must already be sorted
+    if not sorted_samples:
+        return 0.0
+    rank = max(1, round(q / 100 * len(sorted_samples)))
+    return sorted_samples[min(rank, len(sorted_samples)) - 1]
+
+
+def summarize(samples, wall_seconds=None):
+    """Latency summary in milliseconds; throughput over wall time if given."""
+    ordered = sorted(samples)
+    total = sum(ordered)
+    elapsed = wall_seconds if wall_seconds is not None else total
+    return {
+        "count": len(ordered),
+        "mean_ms": round(total / len(ordered) * 1000, 4) if ordered else 0.0,
+        "p50_ms": round(percentile(ordered, 50) * 1000, 4),
+        "p95_ms": round(percentile(ordered, 95) * 1000, 4),
+        "p99_ms": round(percentile(ordered, 99) * 1000, 4),
+        "min_ms": round(ordered[0] * 1000, 4) if ordered else 0.0,
+        "max_ms": round(ordered[-1] * 1000, 4) if ordered else 0.0,
+        "ops_per_sec": round(len(ordered) / elapsed, 2) if elapsed else 0.0,
+    }
+
+
+def measure(fn, args_list, repeat=1):
+    samples = []
+    for _ in range(repeat):
+        for args in args_list:
+            started = time.perf_counter()
+            fn(*args)
+            samples.append(time.perf_counter() - started)
+    return samples
+
+
+def prepare_environment(rows, seed=0, catalog=None, workdir=None):
+    """Point the app at a synthetic catalog and a scratch database.
+
+    Must run before any app module is imported: catalog, storage and chat
+    read CATALOG_CSV / PRODUCTS_DB at import time.
+    """
+    from benchmarks.generate_catalog import write_catalog
+
+    workdir = Path(workdir or tempfile.mkdtemp(prefix="htr-bench-"))
+    workdir.mkdir(parents=True, exist_ok=True)
+    if catalog is None:
+        catalog = workdir / f"catalog-{rows}-{seed}.csv"
+        if not catalog.exists():
+            write_catalog(catalog, rows, seed)
+    os.environ["CATALOG_CSV"] = str(catalog)
+    os.environ["PRODUCTS_DB"] = str(workdir / "products.db")
+    os.environ.setdefault("LLM_PROVIDER", "stub")
+    os.environ.setdefault("MATCH_WORKERS", "1")
+    if str(SERVER_DIR) not in sys.path:
+        sys.path.insert(0, str(SERVER_DIR))
+    return workdir
+
+
+def git_commit():
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=SERVER_DIR,
+            capture_output=True, text=True, check=True,
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def write_results(kind, meta, results, output=None):
+    meta = {
+        "kind": kind,
+        "commit": git_commit(),
+        "timestamp": time.strftime("%Y-%m-%dT%H:%M:%S%z"),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "cpus": os.cpu_count(),
+        **meta,
+    }
+    if output is None:
+        RESULTS_DIR.mkdir(exist_ok=True)
+        output = RESULTS_DIR / f"{kind}-{meta['commit'] or 'nogit'}-{time.strftime('%Y%m%d-%H%M%S')}.json"
+    Path(output).write_text(json.dumps({"meta": meta, "results": results}, indent=2))
+    return output
+
+
+def print_table(results):
+    print(f"{'benchmark':<34}{'count':>8}{'p50 ms':>11}{'p95 ms':>11}{'p99 ms':>11}{'ops/s':>12}")
+    for name, stats in results.items():
+        print(
+            f"{name:<34}{stats['count']:>8}{stats['p50_ms']:>11.3f}{stats['p95_ms']:>11.3f}"
+            f"{stats['p99_ms']:>11.3f}{stats['ops_per_sec']:>12.1f}"
+        )
@@ -0,0 +1,54 @@
+"""Compare two benchmark result files.
+
+Usage (from fastapi_server/):
+    python -m benchmarks.compare BASE.json HEAD.json [--threshold 10]
+
+Prints p50/p95/p99 and throughput deltas per benchmark and flags p95
+regressions above the threshold percentage.
+"""
+import argparse
+import json
+import sys
+
+
+def delta(base, head):
+    if not base:
+        return 0.0
+    return (head - base) / base * 100
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Compare two benchmark result files.")
+    parser.add_argument("base")
+    parser.add_argument("head")
+    parser.add_argument("--threshold", type=float, default=10.0, help="p95 regression threshold in percent")
+    args = parser.parse_args(argv)
+
+    with open(args.base) as f:
+        base = json.load(f)
+    with open(args.head) as f:
+        head = json.load(f)
+    print(f"base {base['meta'].get('commit')}  ->  head {head['meta'].get('commit')}")
+    print(f"{'benchmark':<34}{'p50 ms':>18}{'p95 ms':>18}{'p99 ms':>18}{'ops/s':>12}")
+
+    regressions = []
+    for name, head_stats in head["results"].items():
+        base_stats = base["results"].get(name)
+        if base_stats is None:
+            print(f"{name:<34}  (new)")
+            continue
+        cells = []
+        for key in ("p50_ms", "p95_ms", "p99_ms"):
+            cells.append(f"{head_stats[key]:>9.3f} {delta(base_stats[key], head_stats[key]):>+6.1f}%")
+        throughput = delta(base_stats["ops_per_sec"], head_stats["ops_per_sec"])
+        print(f"{name:<34}{cells[0]:>18}{cells[1]:>18}{cells[2]:>18}{throughput:>+11.1f}%")
+        if delta(base_stats["p95_ms"], head_stats["p95_ms"]) > args.threshold:
+            regressions.append(name)
+
+    if regressions:
+        print(f"\np95 regressions over {args.threshold:.0f}%: " + ", ".join(regressions))
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
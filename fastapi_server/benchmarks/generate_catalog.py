@@ -0,0 +1,135 @@
+"""Synthetic BigBasket-shaped product catalogs.
+
+Usage:
+    python -m benchmarks.generate_catalog 100k -o /tmp/catalog-100k.csv [--seed 7]
+
+Sizes accept k/m suffixes (10k, 100k, 1m). Rows are written as they are
+generated, so even the 1M-row catalog uses constant memory, and the same
+seed always produces byte-identical output.
+"""
+import argparse
+import csv
+import random
+import sys
+
+HEADER = [
+    "index", "ProductID", "ProductName", "Brand", "Price", "DiscountPrice",
+    "Image_Url", "Quantity", "Category", "SubCategory", "Absolute_Url",
+]
+
+SIZES = {"10k": 10_000, "100k": 100_000, "1m": 1_000_000}
+
+# Category -> (subCategories, base product nouns)
+CATEGORIES = {
+    "Fruits & Vegetables": (
+        ["Fresh Vegetables", "Fresh Fruits", "Herbs & Seasonings", "Organic Fruits & Vegetables"],
+        ["onion", "tomato", "potato", "ginger", "garlic", "coriander leaves", "green chilli", "methi",
+         "cauliflower", "spinach", "banana", "apple", "lemon", "carrot", "capsicum"],
+    ),
+    "Foodgrains, Oil & Masala": (
+        ["Rice & Rice Products", "Atta, Flours & Sooji", "Edible Oils & Ghee", "Masalas & Spices",
+         "Salt, Sugar & Jaggery", "Dals & Pulses"],
+        ["basmati rice", "sona masoori rice", "whole wheat atta", "maida", "sunflower oil", "mustard oil",
+         "ghee", "turmeric powder", "red chilli powder", "garam masala", "jeera", "iodised salt",
+         "rock salt", "sugar", "toor dal", "moong dal", "kasuri methi", "black pepper"],
+    ),
+    "Bakery, Cakes & Dairy": (
+        ["Dairy", "Breads & Buns", "Cakes & Pastries", "Cookies, Rusk & Khari"],
+        ["toned milk", "paneer", "curd", "butter", "cheese slices", "fresh cream", "brown bread",
+         "pav", "muffin", "rusk"],
+    ),
+    "Eggs, Meat & Fish": (
+        ["Poultry", "Mutton & Lamb", "Fish & Seafood", "Eggs"],
+        ["chicken breast boneless", "chicken curry cut", "mutton curry cut", "rohu fish", "prawns",
+         "farm eggs"],
+    ),
+    "Snacks & Branded Foods": (
+        ["Ready To Cook & Eat", "Noodles, Pasta, Vermicelli", "Chips & Corn Snacks", "Sauces, Spreads & Dips",
+         "Pickles & Chutney"],
+        ["instant noodles", "pasta", "potato chips", "tomato ketchup", "mango pickle", "paneer butter masala mix",
+         "biryani masala", "corn flakes", "food colour - red", "food color - green"],
+    ),
+    "Beverages": (
+        ["Tea", "Coffee", "Fruit Juices & Drinks", "Energy & Soft Drinks"],
+        ["assam tea", "green tea", "instant coffee", "orange juice", "cola", "lemon drink"],
+    ),
+    "Cleaning & Household": (
+        ["Detergents & Dishwash", "All Purpose Cleaners", "Fresheners & Repellents"],
+        ["detergent powder", "dishwash bar", "floor cleaner", "toilet cleaner", "room freshener"],
+    ),
+    "Beauty & Hygiene": (
+        ["Bath & Hand Wash", "Hair Care", "Oral Care"],
+        ["bathing soap", "hand wash", "shampoo", "coconut hair oil", "toothpaste"],
+    ),
+}
+
+BRANDS = [
+    "Fresho", "BB Royal", "bb Popular", "Tata Sampann", "Aashirvaad", "Fortune", "Saffola", "Amul",
+    "Mother Dairy", "Nandini", "Everest", "MDH", "Catch", "Eastern", "Organic Tattva", "24 Mantra",
+    "Maggi", "Kissan", "Haldiram's", "Britannia", "Parle", "Tata Tea", "Nescafe", "Real",
+    "Surf Excel", "Vim", "Lizol", "Dettol", "Dove", "Colgate", "Licious", "Fresho Signature",
+]
+
+ADJECTIVES = ["", "", "", "Fresh", "Organic", "Premium", "Pure", "Natural", "Classic", "Rich", "Spicy", "Whole"]
+PACKS = ["", "", "- Pouch", "- Pack of 2", "- Value Pack", "- Combo", "- Jar", "- Bottle"]
+QUANTITIES = ["100 g", "200 g", "250 g", "500 g", "1 kg", "2 kg", "5 kg", "500 ml", "1 L", "5 L", "6 pcs", "12 pcs"]
+
+
+def parse_size(value):
+    value = value.lower().replace("_", "")
+    if value in SIZES:
+        return SIZES[value]
+    if value.endswith("k"):
+        return int(float(value[:-1]) * 1_000)
+    if value.endswith("m"):
+        return int(float(value[:-1]) * 1_000_000)
+    return int(value)
+
+
+def generate_rows(rows, seed=0):
+    rng = random.Random(seed)
+    categories = list(CATEGORIES.items())
+    for i in range(rows):
+        category, (sub_categories, nouns) = rng.choice(categories)
+        brand = rng.choice(BRANDS)
+        name = " ".join(part for part in (
+            rng.choice(ADJECTIVES), rng.choice(nouns).title(), rng.choice(PACKS)
+        ) if part)
+        price = rng.choice([15, 25, 40, 60, 99, 120, 150, 199, 250, 399, 550, 899]) * rng.uniform(0.8, 1.3)
+        discount = price * rng.choice([1.0, 1.0, 0.95, 0.9, 0.8, 0.7])
+        product_id = f"{i + 1:07d}"
+        yield [
+            i, product_id, name, brand, f"{price:.0f}", f"{discount:.0f}",
+            f"https://www.bigbasket.com/media/uploads/p/l/{product_id}.jpg",
+            rng.choice(QUANTITIES), category, rng.choice(sub_categories),
+            f"https://www.bigbasket.com/pd/{product_id}/",
+        ]
+
+
+def write_catalog(path, rows, seed=0):
+    with open(path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(HEADER)
+        writer.writerows(generate_rows(rows, seed))
+    return path
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Write a synthetic BigBasket-shaped catalog CSV.")
+    parser.add_argument("size", help="row count: 10k, 100k, 1m or a number")
+    parser.add_argument("-o", "--output", help="CSV path (defaults to stdout)")
+    parser.add_argument("--seed", type=int, default=0)
+    args = parser.parse_args(argv)
+
+    rows = parse_size(args.size)
+    if args.output:
+        write_catalog(args.output, rows, args.seed)
+        print(f"Wrote {rows} rows to {args.output}", file=sys.stderr)
+    else:
+        writer = csv.writer(sys.stdout)
+        writer.writerow(HEADER)
+        writer.writerows(generate_rows(rows, args.seed))
+
+
+if __name__ == "__main__":
+    main()
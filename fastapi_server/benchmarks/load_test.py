@@ -0,0 +1,119 @@
+"""End-to-end load harness: drives the FastAPI app in-process with a stub LLM.
+
+Usage (from fastapi_server/):
+    python -m benchmarks.load_test [--rows 10k] [--requests 2000] [--concurrency 32]
+                                   [--dishes 40] [--llm-latency 0.05] [--output FILE]
+
+Requests go through the full ASGI stack (routing, validation, serialization)
+over httpx's in-process transport, so no server or network is involved.
+The request mix is seeded and repeatable.
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+from collections import defaultdict
+
+from benchmarks.common import prepare_environment, print_table, summarize, write_results
+from benchmarks.generate_catalog import CATEGORIES, parse_size
+
+DISH_WORDS = ["paneer", "butter", "masala", "dal", "tadka", "aloo", "gobi", "chicken", "biryani", "jeera",
+              "rice", "palak", "chole", "rajma", "kadai", "tikka", "korma", "pulao", "sambar", "upma"]
+SEARCH_TERMS = ["onion", "oni", "rice", "basmati", "paneer", "chilli", "masala", "salt", "fresho", "oil"]
+
+# route -> share of the request mix
+MIX = {"chat": 0.15, "search": 0.4, "category": 0.2, "products_page": 0.1, "cart": 0.15}
+
+
+def build_requests(count, dishes, seed):
+    rng = random.Random(seed)
+    dish_names = [" ".join(rng.sample(DISH_WORDS, 2)) for _ in range(dishes)]
+    categories = list(CATEGORIES)
+    routes = list(MIX)
+    weights = [MIX[route] for route in routes]
+    requests = []
+    for _ in range(count):
+        route = rng.choices(routes, weights)[0]
+        if route == "chat":
+            requests.append((route, "POST", "/api/chat", {"json": {"message": rng.choice(dish_names)}}))
+        elif route == "search":
+            requests.append((route, "GET", "/api/products/search",
+                             {"params": {"q": rng.choice(SEARCH_TERMS), "limit": 50}}))
+        elif route == "category":
+            requests.append((route, "GET", f"/api/products/category/{rng.choice(categories)}",
+                             {"params": {"limit": 100}}))
+        elif route == "products_page":
+            requests.append((route, "GET", "/api/products", {"params": {"limit": 100}}))
+        else:
+            requests.append((route, "POST", "/api/cart",
+                             {"json": {"product_id": f"{rng.randint(1, 500):07d}", "quantity": 1}}))
+    return requests
+
+
+async def drive(app, requests, concurrency):
+    import httpx
+
+    samples = defaultdict(list)
+    errors = defaultdict(int)
+    queue = asyncio.Queue()
+    for request in requests:
+        queue.put_nowait(request)
+
+    async def worker(client):
+        while not queue.empty():
+            route, method, url, kwargs = queue.get_nowait()
+            started = time.perf_counter()
+            response = await client.request(method, url, **kwargs)
+            samples[route].append(time.perf_counter() - started)
+            if response.status_code >= 400:
+                errors[route] += 1
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://bench", timeout=None) as client:
+        started = time.perf_counter()
+        await asyncio.gather(*(worker(client) for _ in range(concurrency)))
+        wall = time.perf_counter() - started
+    return samples, errors, wall
+
+
+def run(rows, requests, concurrency, dishes, llm_latency, seed=0, catalog=None):
+    workdir = prepare_environment(rows, seed, catalog=catalog)
+    os.environ["STUB_LLM_LATENCY"] = str(llm_latency)
+    from main import app
+
+    plan = build_requests(requests, dishes, seed)
+    samples, errors, wall = asyncio.run(drive(app, plan, concurrency))
+    results = {f"route.{route}": summarize(values, wall) for route, values in sorted(samples.items())}
+    results["all"] = summarize([value for values in samples.values() for value in values], wall)
+    for route, count in errors.items():
+        results[f"route.{route}"]["errors"] = count
+    meta = {
+        "rows": rows, "requests": requests, "concurrency": concurrency, "dishes": dishes,
+        "llm_latency": llm_latency, "seed": seed, "wall_seconds": round(wall, 3), "workdir": str(workdir),
+    }
+    return meta, results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Load-test the HackTheRecipe API in-process.")
+    parser.add_argument("--rows", default="10k")
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--concurrency", type=int, default=32)
+    parser.add_argument("--dishes", type=int, default=40, help="distinct dishes in the chat mix")
+    parser.add_argument("--llm-latency", type=float, default=0.05, help="stub LLM round trip in seconds")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--catalog", help="load-test an existing catalog CSV instead of a generated one")
+    parser.add_argument("--output", help="result JSON path")
+    args = parser.parse_args(argv)
+
+    meta, results = run(
+        parse_size(args.rows), args.requests, args.concurrency, args.dishes, args.llm_latency,
+        args.seed, args.catalog,
+    )
+    print_table(results)
+    print("Results written to", write_results("load", meta, results, args.output))
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,131 @@
+"""Cold-start profile: where import, startup and first-request time goes.
+
+Usage (from fastapi_server/):
+    python -m benchmarks.startup [--rows 10k] [--runs 3] [--top 12] [--profile] [--output FILE]
+
+Every run is a fresh interpreter (``python -X importtime``) that imports
+main, runs the lifespan hook and serves a first product page, search and
+chat request (stub LLM), the way a serverless cold start would. The first
+run starts from an empty scratch database and pays for the catalog import;
+later runs reuse it, like a warm deploy. The time ``import main`` takes is
+broken down per top-level package. ``--profile`` prints a cProfile of the last run.
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import tempfile
+from collections import defaultdict
+
+from benchmarks.common import SERVER_DIR, prepare_environment, print_table, summarize, write_results
+from benchmarks.generate_catalog import parse_size
+
+FIRST_REQUESTS = [
+    ("first_request.products_page", "GET", "/api/products?limit=100", None),
+    ("first_request.search", "GET", "/api/products/search?q=onion&limit=20", None),
+    ("first_request.chat", "POST", "/api/chat", {"message": "paneer butter masala"}),
+]
+
+# Written to stderr once main is imported; later imports (test client, lazily
+# loaded modules) are not part of the import breakdown
+MAIN_IMPORTED = "-- main imported\n"
+
+CHILD = """
+import cProfile, json, sys, time
+output, profile = sys.argv[1], sys.argv[2] == "1"
+profiler = cProfile.Profile() if profile else None
+if profiler:
+    profiler.enable()
+started = time.perf_counter()
+import main
+timings = {"startup.import_main": time.perf_counter() - started}
+sys.stderr.write(%r)
+sys.stderr.flush()
+from starlette.testclient import TestClient
+client = TestClient(main.app)
+started = time.perf_counter()
+client.__enter__()
+timings["startup.lifespan"] = time.perf_counter() - started
+for name, method, path, body in %r:
+    started = time.perf_counter()
+    client.request(method, path, json=body)
+    timings[name] = time.perf_counter() - started
+client.__exit__(None, None, None)
+if profiler:
+    profiler.disable()
+    import pstats
+    pstats.Stats(profiler).sort_stats("cumulative").print_stats(40)
+with open(output, "w") as f:
+    json.dump(timings, f)
+""" % (MAIN_IMPORTED, FIRST_REQUESTS)
+
+
+def import_times(stderr):
+    """Self time in seconds per top-level package imported by ``import main``."""
+    totals = defaultdict(float)
+    for line in stderr.partition(MAIN_IMPORTED)[0].splitlines():
+        if not line.startswith("import time:") or "self [us]" in line:
+            continue
+        self_us, _, name = line[len("import time:"):].split("|")
+        totals[name.strip().split(".")[0]] += int(self_us) / 1e6
+    return totals
+
+
+def run_once(profile=False):
+    with tempfile.NamedTemporaryFile(suffix=".json", delete=False) as f:
+        output = f.name
+    try:
+        completed = subprocess.run(
+            [sys.executable, "-X", "importtime", "-c", CHILD, output, "1" if profile else "0"],
+            cwd=SERVER_DIR, env=os.environ.copy(), capture_output=True, text=True,
+        )
+        if completed.returncode != 0:
+            raise RuntimeError(f"startup run failed:\n{completed.stderr[-2000:]}")
+        if profile:
+            print(completed.stdout)
+        with open(output) as f:
+            return json.load(f), import_times(completed.stderr)
+    finally:
+        os.unlink(output)
+
+
+def run(rows, seed=0, runs=3, top=12, profile=False, catalog=None):
+    workdir = prepare_environment(rows, seed, catalog=catalog)
+    samples = defaultdict(list)
+    packages = defaultdict(list)
+    for i in range(runs):
+        timings, imports = run_once(profile=profile and i == runs - 1)
+        phase = "cold" if i == 0 else "warm"
+        for name, seconds in timings.items():
+            samples[f"{phase}.{name}"].append(seconds)
+        for package, seconds in imports.items():
+            packages[package].append(seconds)
+
+    results = {name: summarize(values) for name, values in samples.items()}
+    # Heaviest imports by mean self time, summed over each package's modules
+    ranked = sorted(packages.items(), key=lambda item: -sum(item[1]) / len(item[1]))
+    for package, values in ranked[:top]:
+        results[f"import.{package}"] = summarize(values)
+    meta = {"rows": rows, "seed": seed, "runs": runs, "workdir": str(workdir)}
+    return meta, results
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Profile HackTheRecipe cold starts.")
+    parser.add_argument("--rows", default="10k", help="synthetic catalog size: 10k, 100k, 1m or a number")
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument("--runs", type=int, default=3, help="fresh interpreters to start; the first is a cold DB")
+    parser.add_argument("--top", type=int, default=12, help="packages to report in the import breakdown")
+    parser.add_argument("--catalog", help="profile with an existing catalog CSV instead of a generated one")
+    parser.add_argument("--profile", action="store_true", help="print a cProfile of the last run")
+    parser.add_argument("--output", help="result JSON path")
+    args = parser.parse_args(argv)
+
+    meta, results = run(parse_size(args.rows), args.seed, args.runs, args.top, args.profile, args.catalog)
+    print_table(results)
+    print("Results written to", write_results("startup", meta, results, args.output))
+
+
+if __name__ == "__main__":
+    main()
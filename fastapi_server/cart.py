@@ -1,6 +1,7 @@
 from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
-from storage import storage
+from pydantic import BaseModel, model_validator
+from typing import List, Literal, Optional
+from storage import get_storage
 
 router = APIRouter(prefix="/api/cart", tags=["Cart"])
 
@@ -8,18 +9,42 @@ class CartItemRequest(BaseModel):
     product_id: str
     quantity: int
 
+class CartOperation(BaseModel):
+    op: Literal["add", "update", "remove"]
+    product_id: str
+    # Required for add and update; remove ignores it
+    quantity: Optional[int] = None
+
+    @model_validator(mode="after")
+    def check_quantity(self):
+        if self.op != "remove" and (self.quantity is None or self.quantity < 1):
+            raise ValueError(f"{self.op} needs a quantity of at least 1")
+        return self
+
+class CartBatchRequest(BaseModel):
+    operations: List[CartOperation]
+
 @router.get("")
 def get_cart():
-    items = storage.get_cart_items()
+    items = get_storage().get_cart_items()
     # Always return a list, even if empty
     return items if isinstance(items, list) else []
 
 @router.post("")
 def add_to_cart(item: CartItemRequest):
     try:
-        storage.add_to_cart(item.product_id, item.quantity)
-        # Return the updated cart as a list
-        items = storage.get_cart_items()
+        # Just the upserted item; clients re-read the cart with GET when they need it
+        quantity = get_storage().add_to_cart(item.product_id, item.quantity)
+        return {"product_id": item.product_id, "quantity": quantity}
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=str(e))
+
+@router.post("/batch")
+def batch_update_cart(batch: CartBatchRequest):
+    # Applies every operation in one transaction, then returns the cart once
+    try:
+        get_storage().apply_cart_operations([operation.model_dump() for operation in batch.operations])
+        items = get_storage().get_cart_items()
         return items if isinstance(items, list) else []
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -27,7 +52,7 @@ def add_to_cart(item: CartItemRequest):
 @router.put("")
 def update_cart(item: CartItemRequest):
     try:
-        storage.update_cart_item(item.product_id, item.quantity)
+        get_storage().update_cart_item(item.product_id, item.quantity)
         return {"status": "ok"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
@@ -35,7 +60,7 @@ def update_cart(item: CartItemRequest):
 @router.delete("/{product_id}")
 def remove_from_cart(product_id: str):
     try:
-        storage.remove_from_cart(product_id)
+        get_storage().remove_from_cart(product_id)
         return {"status": "ok"}
     except Exception as e:
         raise HTTPException(status_code=500, detail=str(e))
\ No newline at end of file
@@ -0,0 +1,269 @@
+import csv
+import hashlib
+import io
+import os
+import sys
+import threading
+from pathlib import Path
+
+from catalog_changes import import_generation, latest_revision, note_revision, read_changes, read_log
+from database import read_engine
+from metrics import span
+
+CSV_CANDIDATES = [
+    Path(__file__).parent / "bigbasket_products.csv",
+    Path(__file__).parent.parent / "attached_assets" / "bigbasket_products.csv",
+]
+# CATALOG_CSV points the app at another catalog file (benchmarks, staging data)
+if os.getenv("CATALOG_CSV"):
+    CSV_CANDIDATES = [Path(os.environ["CATALOG_CSV"])]
+
+# CSV header -> CatalogProduct attribute
+CSV_COLUMNS = {
+    "ProductID": "id",
+    "ProductName": "productName",
+    "Price": "price",
+    "DiscountPrice": "discountPrice",
+    "Brand": "brand",
+    "Image_Url": "imageUrl",
+    "Category": "category",
+    "SubCategory": "subCategory",
+    "Absolute_Url": "absoluteUrl",
+}
+# Logged changes a snapshot remembers; consumers further behind rebuild
+CHANGE_HISTORY = 10000
+
+
+class CatalogProduct:
+    __slots__ = tuple(CSV_COLUMNS.values())
+
+    def __init__(self, id, productName, price, discountPrice, brand, imageUrl, category, subCategory, absoluteUrl):
+        self.id = id
+        self.productName = productName
+        self.price = price
+        self.discountPrice = discountPrice
+        self.brand = brand
+        self.imageUrl = imageUrl
+        self.category = category
+        self.subCategory = subCategory
+        self.absoluteUrl = absoluteUrl
+
+    @classmethod
+    def from_row(cls, row):
+        return cls(
+            id=row["ProductID"],
+            productName=row["ProductName"],
+            price=row["Price"],
+            discountPrice=row["DiscountPrice"],
+            # Low-cardinality columns are interned so 30k rows share a few hundred strings
+            brand=sys.intern(row["Brand"]),
+            imageUrl=row["Image_Url"],
+            category=sys.intern(row["Category"]),
+            subCategory=sys.intern(row["SubCategory"]),
+            absoluteUrl=row["Absolute_Url"],
+        )
+
+    @classmethod
+    def from_dict(cls, data):
+        return cls.from_row({column: data[field] for column, field in CSV_COLUMNS.items()})
+
+    def to_dict(self):
+        return {field: getattr(self, field) for field in self.__slots__}
+
+
+def catalog_version(base_version, revision):
+    return f"{base_version}.{revision}" if revision else base_version
+
+
+class CatalogSnapshot:
+    """Immutable view of one version of the product catalog.
+
+    ``file_version`` is the hash of the catalog file and ``generation`` the
+    database import whose change-log entries are applied on top of it;
+    together they make ``base_version``. ``revision`` is the change-log
+    revision the snapshot is current to (0 for the file as is).
+    ``history`` keeps the latest applied entries, so consumers built for an
+    older snapshot can catch up with ``changes_since``.
+    """
+
+    __slots__ = (
+        "version", "base_version", "file_version", "generation", "revision", "source", "products", "by_id",
+        "history", "history_start",
+    )
+
+    def __init__(self, file_version, source, products, revision=0, history=(), history_start=0, by_id=None,
+                 generation=None):
+        self.file_version = file_version
+        self.generation = generation
+        self.base_version = f"{file_version}-{generation}" if generation else file_version
+        self.version = catalog_version(self.base_version, revision)
+        self.revision = revision
+        self.source = source
+        self.products = tuple(products)
+        self.by_id = by_id if by_id is not None else {product.id: product for product in self.products}
+        self.history = history
+        self.history_start = history_start
+
+    def __len__(self):
+        return len(self.products)
+
+    def apply(self, changes, revision=None):
+        """A new snapshot with logged ``changes`` ``[(seq, product_id, fields or None)]`` applied.
+
+        Updated products keep their position, created ones are appended and
+        deleted ones dropped, as the change log replays onto a fresh load.
+        The result is current to ``revision``, by default the last change;
+        entries made against other imports leave gaps in the sequence.
+        """
+        if revision is None:
+            revision = changes[-1][0] if changes else self.revision
+        if not changes:
+            if revision == self.revision:
+                return self
+            return CatalogSnapshot(
+                self.file_version, self.source, self.products, revision, self.history, self.history_start,
+                self.by_id, self.generation,
+            )
+        by_id = dict(self.by_id)
+        applied = []
+        for seq, product_id, data in changes:
+            product = None if data is None else CatalogProduct.from_dict(data)
+            if product is None:
+                by_id.pop(product_id, None)
+            else:
+                by_id[product_id] = product
+            applied.append((seq, product_id, product))
+        history = self.history + tuple(applied)
+        history_start = self.history_start
+        if len(history) > CHANGE_HISTORY:
+            history_start = history[-CHANGE_HISTORY - 1][0]
+            history = history[-CHANGE_HISTORY:]
+        return CatalogSnapshot(
+            self.file_version, self.source, by_id.values(), revision, history, history_start, by_id, self.generation
+        )
+
+    def changes_since(self, previous):
+        """``[(old, new), ...]`` product pairs that turn ``previous`` into this snapshot, oldest first.
+
+        ``old`` is None for a created product and ``new`` for a deleted one.
+        None when ``previous`` is for another catalog file or older than the
+        history reaches.
+        """
+        if (
+            previous is None or previous.base_version != self.base_version
+            or not self.history_start <= previous.revision <= self.revision
+        ):
+            return None
+        current = {}
+        pairs = []
+        for seq, product_id, product in self.history:
+            if seq <= previous.revision:
+                continue
+            old = current[product_id] if product_id in current else previous.by_id.get(product_id)
+            if old is not None or product is not None:
+                pairs.append((old, product))
+            current[product_id] = product
+        return pairs
+
+
+def find_catalog_csv():
+    for path in CSV_CANDIDATES:
+        if path.exists():
+            return path
+    raise FileNotFoundError(
+        "Product catalog CSV not found in: " + ", ".join(str(p) for p in CSV_CANDIDATES)
+    )
+
+
+def file_version(path):
+    # Same digest load_snapshot uses, without holding the whole file in memory
+    digest = hashlib.sha1()
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()[:16]
+
+
+def load_snapshot(path, generation=None):
+    data = Path(path).read_bytes()
+    version = hashlib.sha1(data).hexdigest()[:16]
+    reader = csv.DictReader(io.StringIO(data.decode("utf-8"), newline=""))
+    return CatalogSnapshot(
+        version, Path(path), (CatalogProduct.from_row(row) for row in reader), generation=generation
+    )
+
+
+def load_catalog(path, upto=None):
+    """The catalog file with the current import's change log (up to revision ``upto``) applied."""
+    generation, revision, changes = read_log(read_engine, upto=upto)
+    return load_snapshot(path, generation).apply(changes, revision)
+
+
+_snapshot = None
+_signature = None
+_generation = None
+_lock = threading.Lock()
+_version = None
+_version_signature = None
+
+
+def get_file_version():
+    """Hash of the current catalog file, without parsing it.
+
+    The startup import check only needs the content hash, so it doesn't
+    make a cold process build the whole snapshot.
+    """
+    global _version, _version_signature
+    path = find_catalog_csv()
+    stat = path.stat()
+    signature = (str(path), stat.st_mtime_ns, stat.st_size)
+    if signature == _signature:
+        return _snapshot.file_version
+    if signature != _version_signature:
+        _version = file_version(path)
+        _version_signature = signature
+    return _version
+
+
+def get_catalog_version():
+    """Version of what the products table holds, which cache validators key on.
+
+    The import generation plus the change-log revision; databases imported
+    before generations were recorded fall back to the catalog file's hash.
+    """
+    return catalog_version(import_generation() or get_file_version(), latest_revision())
+
+
+def get_catalog():
+    """Return the process-wide catalog snapshot, reloading it if the CSV changed.
+
+    Change detection is a ``stat`` call; the file is only re-read when its
+    mtime or size moves, and the snapshot version is the content hash, so a
+    touched but unchanged file keeps its version. Writes logged since the
+    snapshot was built are applied to a copy of it; a new database import
+    reloads it without the previous import's writes. Readers always see
+    either the old or the new snapshot, never a partial one.
+    """
+    global _snapshot, _signature, _generation
+    path = find_catalog_csv()
+    stat = path.stat()
+    signature = (str(path), stat.st_mtime_ns, stat.st_size)
+    revision = latest_revision()
+    generation = import_generation()
+    if signature == _signature and generation == _generation and revision <= _snapshot.revision:
+        return _snapshot
+    with _lock:
+        # A new import drops the previous one's change log: start over from the file
+        if signature != _signature or generation != _generation:
+            with span("catalog.load"):
+                snapshot = load_catalog(path)
+            if _snapshot is None or snapshot.version != _snapshot.version:
+                _snapshot = snapshot
+            _signature, _generation = signature, generation
+        elif revision > _snapshot.revision:
+            with span("catalog.apply_changes"):
+                _snapshot = _snapshot.apply(
+                    read_changes(read_engine, _snapshot.generation, _snapshot.revision, revision), revision
+                )
+        note_revision(_snapshot.revision)
+    return _snapshot
@@ -0,0 +1,171 @@
+"""Append-only log of product writes made through the API.
+
+The catalog CSV stays the base. Every create, update or delete made through
+the API is appended to ``catalog_changes`` in the same transaction that
+writes the products table, and the sequence number of the newest entry is
+the catalog revision. Snapshots, matching engines and caches built for an
+older revision replay just the entries after it, so a write costs work
+proportional to the products it touched.
+
+Imports replace the table wholesale instead; each one records a new import
+generation in ``catalog_meta``. Together, the generation and the revision
+identify what the products table holds. Entries are stamped with the
+generation they were made against and only that generation's entries are
+replayed, so a newly imported file wins over earlier API writes; the import
+compacts the log by deleting them. The revision keeps counting up across
+compactions.
+"""
+import json
+import os
+import time
+
+from sqlalchemy.exc import OperationalError
+
+from database import read_engine
+
+# How stale another worker's view of the revision and import generation may
+# get; writes made in this process are seen at once
+POLL_SECONDS = float(os.getenv("CATALOG_POLL_SECONDS", "1.0"))
+GENERATION_KEY = "import_generation"
+
+
+def create_changes_table(conn):
+    conn.exec_driver_sql("""
+        CREATE TABLE IF NOT EXISTS catalog_changes (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            product_id TEXT NOT NULL,
+            data TEXT,
+            changed_at REAL,
+            generation TEXT
+        )
+    """)
+    columns = {row[1] for row in conn.exec_driver_sql("PRAGMA table_info(catalog_changes)")}
+    if "generation" not in columns:
+        # Logs written before entries were stamped belong to the import in force
+        conn.exec_driver_sql("ALTER TABLE catalog_changes ADD COLUMN generation TEXT")
+        conn.exec_driver_sql("UPDATE catalog_changes SET generation = ?", (current_generation(conn),))
+
+
+def current_generation(conn):
+    try:
+        return conn.exec_driver_sql(
+            "SELECT value FROM catalog_meta WHERE key = ?", (GENERATION_KEY,)
+        ).scalar()
+    except OperationalError:
+        # Nothing imported yet
+        return None
+
+
+def current_revision(conn):
+    # The highest sequence number ever issued, which compaction doesn't lower
+    try:
+        return conn.exec_driver_sql(
+            "SELECT seq FROM sqlite_sequence WHERE name = 'catalog_changes'"
+        ).scalar() or 0
+    except OperationalError:
+        return 0
+
+
+def append_changes(conn, changes):
+    """Log ``[(product_id, fields or None for a delete), ...]`` and return the new revision.
+
+    Entries are stamped with the import generation they were made against.
+    """
+    now = time.time()
+    generation = current_generation(conn)
+    conn.exec_driver_sql(
+        "INSERT INTO catalog_changes (product_id, data, changed_at, generation) VALUES (?, ?, ?, ?)",
+        [
+            (product_id, None if data is None else json.dumps(data), now, generation)
+            for product_id, data in changes
+        ]
+    )
+    return conn.exec_driver_sql("SELECT MAX(seq) FROM catalog_changes").scalar()
+
+
+def compact_changes(conn, generation):
+    """Drop entries made against any import generation but ``generation``; returns how many.
+
+    A new import replaces the products table with the file, so earlier
+    writes no longer apply to anything.
+    """
+    create_changes_table(conn)
+    return conn.exec_driver_sql(
+        "DELETE FROM catalog_changes WHERE generation IS NOT ?", (generation,)
+    ).rowcount
+
+
+def _changes(conn, generation, after, upto):
+    query = "SELECT seq, product_id, data FROM catalog_changes WHERE generation IS ? AND seq > ?"
+    params = (generation, after)
+    if upto is not None:
+        query += " AND seq <= ?"
+        params += (upto,)
+    try:
+        rows = conn.exec_driver_sql(query + " ORDER BY seq", params).fetchall()
+    except OperationalError:
+        # No log table yet: nothing was ever written through the API
+        return []
+    return [(seq, product_id, None if data is None else json.loads(data)) for seq, product_id, data in rows]
+
+
+def read_changes(engine, generation, after=0, upto=None):
+    """``[(seq, product_id, fields or None), ...]`` made against ``generation`` after revision ``after``, oldest first."""
+    with engine.connect() as conn:
+        return _changes(conn, generation, after, upto)
+
+
+def read_log(engine, upto=None):
+    """``(generation, revision, changes)``: the import in force, the newest
+    revision (or ``upto``) and the entries made against that import, read together.
+    """
+    with engine.connect() as conn:
+        generation = current_generation(conn)
+        revision = current_revision(conn) if upto is None else upto
+        return generation, revision, _changes(conn, generation, 0, revision)
+
+
+def changed_product_ids(engine, after, upto):
+    try:
+        with engine.connect() as conn:
+            return [row[0] for row in conn.exec_driver_sql(
+                "SELECT DISTINCT product_id FROM catalog_changes WHERE seq > ? AND seq <= ?", (after, upto)
+            )]
+    except OperationalError:
+        return []
+
+
+_revision = 0
+_generation = None
+_polled = None
+
+
+def _poll():
+    # Re-reads the revision and import generation at most every POLL_SECONDS
+    global _revision, _generation, _polled
+    now = time.monotonic()
+    if _polled is not None and now - _polled < POLL_SECONDS:
+        return
+    with read_engine.connect() as conn:
+        revision = current_revision(conn)
+        _generation = current_generation(conn)
+    _revision = max(_revision, revision)
+    _polled = now
+
+
+def latest_revision():
+    """Newest logged revision."""
+    _poll()
+    return _revision
+
+
+def import_generation():
+    """Token of the newest catalog import, None if the database predates them."""
+    _poll()
+    return _generation
+
+
+def note_revision(revision):
+    # Called after a write commits, so this process sees it without waiting for a poll
+    global _revision
+    _revision = max(_revision, revision)
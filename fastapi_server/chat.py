@@ -1,20 +1,38 @@
 from fastapi import APIRouter, HTTPException
-from pydantic import BaseModel
+from fastapi.concurrency import run_in_threadpool
+from fastapi.responses import StreamingResponse
+from pydantic import BaseModel, Field
+import asyncio
+import logging
 import os
 from dotenv import load_dotenv
-import sqlite3
-from pathlib import Path
-from langchain_google_genai import ChatGoogleGenerativeAI
-from difflib import get_close_matches
 import ast
-import csv
 import re
-from collections import Counter
+import threading
+import time
+from concurrent.futures.process import BrokenProcessPool
+from typing import Optional
+from catalog import get_catalog
+from database import read_engine, write_engine
+from ingredient_cache import IngredientCache
+from llm import SingleFlight, client_stats, get_llm_client
+from match_store import MatchStore
+from metrics import REGISTRY, span
+from serialization import (
+    dumps, encode_ingredient_match, encode_ingredient_matches, get_product_payloads, json_response, sse_event,
+)
+from matching_pool import MatchingPool, StaleCatalogError, default_workers
+from matching import MAX_MATCHES, build_matching_engine, get_ingredient_synonyms, simple_tokenize
+from rules import get_rules
 
 load_dotenv()
 
+logger = logging.getLogger(__name__)
+
 router = APIRouter(prefix="/api/chat", tags=["Chat"])
 
+MAX_BATCH_DISHES = 20
+
 class ChatRequest(BaseModel):
     message: str
 
@@ -25,62 +43,186 @@ class IngredientMatch(BaseModel):
 class ChatResponse(BaseModel):
     ingredients: list[IngredientMatch]
 
+class BatchChatRequest(BaseModel):
+    messages: list[str] = Field(..., min_length=1, max_length=MAX_BATCH_DISHES)
+
+class DishMatch(BaseModel):
+    message: str
+    ingredients: list[IngredientMatch] = []
+    error: Optional[str] = None
+
+class BatchChatResponse(BaseModel):
+    dishes: list[DishMatch]
+
 def get_all_products():
-    products = []
-    csv_path = Path(__file__).parent / "bigbasket_products.csv"
-    if not csv_path.exists():
-        # Fallback to same folder as chat.py
-        csv_path = Path(__file__).parent / "bigbasket_products.csv"
-    with open(csv_path, newline='', encoding='utf-8') as csvfile:
-        reader = csv.DictReader(csvfile)
-        for row in reader:
-            products.append({
-                "id": row["ProductID"],
-                "productName": row["ProductName"],
-                "price": row["Price"],
-                "discountPrice": row["DiscountPrice"],
-                "brand": row["Brand"],
-                "imageUrl": row["Image_Url"],
-                "category": row["Category"],
-                "subCategory": row["SubCategory"],
-                "absoluteUrl": row["Absolute_Url"],
-            })
-    return products
-
-def simple_tokenize(text):
-    text = re.sub(r'[^\w\s]', ' ', text.lower())
-    return [word for word in text.split() if len(word) > 2]
-
-def get_ingredient_synonyms():
+    return [product.to_dict() for product in get_catalog().products]
+
+_engine = None
+_engine_catalog = None
+_engine_version = None
+_engine_lock = threading.Lock()
+
+def get_matching_engine():
+    # Rebuild only when the catalog file or the matching rules change, not on every
+    # request; writes through the product API are applied to the current engine
+    catalog = get_catalog()
+    rules = get_rules()
+    global _engine, _engine_catalog, _engine_version
+    if _engine_version != (catalog.version, rules.version):
+        with _engine_lock:
+            if _engine_version != (catalog.version, rules.version):
+                changes = None
+                if _engine is not None and _engine.rules.version == rules.version:
+                    changes = catalog.changes_since(_engine_catalog)
+                if changes is None:
+                    with span("matching.engine_build"):
+                        _engine = build_matching_engine(
+                            catalog.products, version=catalog.base_version, rules=rules, revision=catalog.revision
+                        )
+                else:
+                    with span("matching.engine_update"):
+                        _engine = _engine.apply_changes(changes, catalog.revision)
+                _engine_catalog = catalog
+                _engine_version = (catalog.version, rules.version)
+    return _engine
+
+# A pool that breaks (a worker died) is replaced; after this many breaks in a row matching stays inline
+MAX_POOL_FAILURES = 3
+
+_pool = None
+_pool_disabled = False
+_pool_failures = 0
+_pool_lock = threading.Lock()
+
+def get_matching_pool(engine):
+    # One pool per catalog file and rules version, kept across catalog writes;
+    # None when disabled (MATCH_WORKERS <= 1) or broken
+    global _pool, _pool_disabled
+    if _pool_disabled or default_workers() <= 1:
+        return None
+    if _pool is None or _pool.version != engine.store_version:
+        with _pool_lock:
+            if _pool is None or _pool.version != engine.store_version:
+                if _pool is not None:
+                    _pool.shutdown()
+                try:
+                    _pool = MatchingPool(get_catalog(), engine.rules)
+                except (OSError, NotImplementedError) as e:
+                    logger.warning("Matching pool unavailable, matching inline: %s", e)
+                    _pool, _pool_disabled = None, True
+    return _pool
+
+def discard_matching_pool(pool):
+    global _pool, _pool_disabled, _pool_failures
+    with _pool_lock:
+        if _pool is pool:
+            pool.shutdown()
+            _pool = None
+            _pool_failures += 1
+            _pool_disabled = _pool_failures >= MAX_POOL_FAILURES
+
+def compute_matches(engine, ingredients):
+    # Ranked product ids per ingredient. Several ingredients fan out over the
+    # matching pool; a single one, or any pool failure, is matched inline with
+    # identical results
+    global _pool_failures
+    pool = get_matching_pool(engine) if len(ingredients) > 1 else None
+    # Until its workers have loaded the catalog, the pool would only add their startup time
+    if pool is not None and pool.ready and pool.version == engine.store_version:
+        try:
+            matches = pool.match_ids(ingredients, engine.revision)
+            _pool_failures = 0
+            return matches
+        except BrokenProcessPool as e:
+            logger.warning("Matching pool broke, matching inline: %s", e)
+            discard_matching_pool(pool)
+        except StaleCatalogError as e:
+            logger.warning("Matching pool failed, matching inline: %s", e)
+    return [[engine.products[i].id for i in engine.ranked_indices(ingredient)] for ingredient in ingredients]
+
+def stored_rankings(engine, ingredients):
+    # Rankings from before recent catalog writes are kept when the writes can't have moved them
+    with span("matching.store_lookup"):
+        return get_match_store().get_many(engine.store_version, ingredients, engine.revision, engine.unaffected)
+
+def rank_products(ingredients):
+    """Map each distinct normalized ingredient to its top catalog products.
+
+    Rankings already materialized for the current catalog version are plain
+    lookups. The rest are computed, fanned out over the matching pool when
+    there are several, and stored for next time.
+    """
+    engine = get_matching_engine()
+    unique = list(dict.fromkeys(ingredient.strip().lower() for ingredient in ingredients))
+    ranked = stored_rankings(engine, unique)
+    missing = [ingredient for ingredient in unique if ingredient not in ranked]
+    if missing:
+        with span("matching.compute"):
+            computed = dict(zip(missing, compute_matches(engine, missing)))
+        with span("matching.store_write"):
+            get_match_store().put_many(engine.store_version, computed, engine.revision)
+        ranked.update(computed)
     return {
-        'chicken': ['chicken', 'poultry', 'hen', 'broiler', 'fresh boneless chicken breast', 'fresh boneless chicken thigh', 'breast', 'thigh'],
-        'onion': ['onion', 'pyaz', 'kanda'],
-        'tomato': ['tomato', 'tamatar'],
-        'potato': ['potato', 'aloo', 'batata'],
-        'rice': ['rice', 'chawal', 'basmati rice', 'jasmine'],
-        'oil': ['oil', 'tel', 'cooking oil'],
-        'salt': ['salt', 'namak', 'sea salt', 'rock salt', 'iodised'],
-        'sugar': ['sugar', 'cheeni', 'shakkar'],
-        'milk': ['milk', 'doodh', 'dairy'],
-        'butter': ['butter', 'makhan'],
-        'flour': ['flour', 'maida', 'atta', 'wheat flour'],
-        'paneer': ['paneer', 'cottage cheese'],
-        'yogurt': ['yogurt', 'curd', 'dahi'],
-        'ginger': ['ginger', 'adrak'],
-        'garlic': ['garlic', 'lahsun'],
-        'cumin': ['cumin', 'jeera'],
-        'turmeric': ['turmeric', 'haldi'],
-        'coriander': ['coriander', 'dhania'],
-        'pepper': ['pepper', 'kali mirch', 'black pepper'],
-        'cilantro': ['cilantro'],
-        'chili powder': ['chili powder', 'red chili powder','chilli powder'],
-        'garam masala': ['garam masala', 'garam'],
-        'fenugreek leaves': ['fenugreek leaves', 'kasuri methi','methi'],
-        'food coloring': ['food color', 'colouring', 'coloring', 'artificial colour', 'artificial color', 'edible color', 'edible dye', 'natural color', 'food colour - red', 'food colour - blue', 'food colour - green'],
-        'green chili': ['green chili', 'hari mirch', 'green chilli', 'green chilies', 'green chilly'],
-        'red chili powder': ['red chili powder', 'red chili', 'lal mirch', 'red chilies', 'red chilly']
+        ingredient: [engine.by_id[product_id] for product_id in ranked[ingredient]]
+        for ingredient in unique
     }
 
+def stream_ranked_products(ingredients):
+    """Yield ``(position, ingredient, products)`` as each ingredient's ranking becomes available.
+
+    Rankings already in the match store come first, from one lookup; the
+    rest are computed one at a time, cheapest first, so a slow ingredient
+    never holds back a fast one.
+    """
+    engine = get_matching_engine()
+    keys = [ingredient.strip().lower() for ingredient in ingredients]
+    stored = stored_rankings(engine, list(dict.fromkeys(keys)))
+    ranked = {key: [engine.by_id[product_id] for product_id in product_ids] for key, product_ids in stored.items()}
+    pending = []
+    for position, (ingredient, key) in enumerate(zip(ingredients, keys)):
+        if key in ranked:
+            yield position, ingredient, ranked[key]
+        else:
+            pending.append(position)
+    pending.sort(key=lambda position: engine.match_cost(keys[position]))
+    for position in pending:
+        key = keys[position]
+        if key not in ranked:
+            ranked.update(rank_products([key]))
+        yield position, ingredients[position], ranked[key]
+
+def match_products(ingredients):
+    return {
+        ingredient: [product.to_dict() for product in products]
+        for ingredient, products in rank_products(ingredients).items()
+    }
+
+WARMUP_TOP_INGREDIENTS = 200
+
+def warm_match_store():
+    # Synonym keys plus whatever real dishes use most
+    keys = list(get_ingredient_synonyms()) + get_ingredient_cache().top_ingredients(WARMUP_TOP_INGREDIENTS)
+    started = time.perf_counter()
+    match_products(keys)
+    logger.info("Match store warmed: %d ingredients in %.2fs", len(set(keys)), time.perf_counter() - started)
+
+def start_matching_pool():
+    # With MATCH_WORKERS > 1, spawn the pool at startup rather than on the first chat request
+    if default_workers() <= 1:
+        return None
+    thread = threading.Thread(
+        target=lambda: get_matching_pool(get_matching_engine()), name="matching-pool", daemon=True
+    )
+    thread.start()
+    return thread
+
+def start_match_warmup():
+    if os.getenv("MATCH_WARMUP", "").lower() not in ("1", "true", "yes"):
+        return None
+    thread = threading.Thread(target=warm_match_store, name="match-warmup", daemon=True)
+    thread.start()
+    return thread
+
 def calculate_text_similarity(text1, text2):
     tokens1 = set(simple_tokenize(text1))
     tokens2 = set(simple_tokenize(text2))
@@ -91,35 +233,21 @@ def calculate_text_similarity(text1, text2):
     return len(intersection) / len(union) if union else 0
 
 def smart_ingredient_matching(ingredient, products):
+    # Plain substring scans over the rule lists: the reference MatchingEngine is checked against
+    rules = get_rules()
     norm_ingredient = ingredient.strip().lower()
-    synonyms = get_ingredient_synonyms()
+    synonyms = rules.synonyms
     ingredient_variations = synonyms.get(norm_ingredient, [norm_ingredient]) + [norm_ingredient]
 
     if norm_ingredient == "food coloring":
         def has_coloring(term):
             term = term.lower()
-            bad_phrases = ['no artificial colour', 'no artificial color', 'no added color', 'no added colour',
-                           'without artificial colour', 'without artificial color']
-            if any(bad in term for bad in bad_phrases):
+            if any(bad in term for bad in rules.coloring_bad_phrases):
                 return False
-            return any(color in term for color in ['food colour', 'food color', 'edible colour', 'edible color'])
+            return any(color in term for color in rules.coloring_phrases)
 
         matches = [p for p in products if has_coloring(p["productName"])]
-        return matches[:8]
-
-    preferred_categories = [
-        'fruits', 'vegetables', 'meat', 'seafood', 'dairy', 'grains', 'spices',
-        'oil', 'condiments', 'bakery', 'fresh produce', 'protein', 'staples'
-    ]
-
-    exclude_keywords = [
-        'ready', 'instant', 'mix', 'frozen', 'prepared', 'cooked', 'fried', 'baked','soap', 'cleaner', 'detergent',
-        'curry', 'gravy', 'sauce', 'paste', 'seasoning', 'dip', 'dips',
-        'snack', 'chips', 'crackers', 'biscuit', 'cookie', 'cake', 'bread',
-        'burger', 'pizza', 'sandwich', 'roll', 'wrap', 'patty', 'nugget',
-        'momo', 'dumpling', 'noodles', 'pasta', 'soup', 'biryani',
-        'flavour', 'flavored', 'spiced', 'seasoned', 'marinated', 'pickled'
-    ]
+        return matches[:MAX_MATCHES]
 
     scored_matches = []
 
@@ -131,7 +259,7 @@ def smart_ingredient_matching(ingredient, products):
 
         full_text = f"{product_name} {brand_name}"
         if not any(variation in product_name for variation in ingredient_variations):
-            if any(k in full_text for k in exclude_keywords) or len(product_name.split()) > 6:
+            if any(k in full_text for k in rules.exclude_keywords) or len(product_name.split()) > 6:
                 continue
 
         score = 0
@@ -166,12 +294,11 @@ def smart_ingredient_matching(ingredient, products):
                 matched_variation = variation
 
         if score > 0:
-            if any(cat in category or cat in sub_category for cat in preferred_categories):
+            if any(cat in category or cat in sub_category for cat in rules.preferred_categories):
                 score += 15
             similarity = calculate_text_similarity(norm_ingredient, product_name)
             score += similarity * 25
-            preferred_keywords = ['fresh', 'raw', 'organic', 'pure', 'natural', 'whole']
-            if any(k in full_text for k in preferred_keywords):
+            if any(k in full_text for k in rules.preferred_keywords):
                 score += 20
             if len(product_name.split()) <= 3:
                 score += 10
@@ -179,102 +306,201 @@ def smart_ingredient_matching(ingredient, products):
                 scored_matches.append((product, score, matched_variation))
 
     scored_matches.sort(key=lambda x: x[1], reverse=True)
-    return [match[0] for match in scored_matches[:8]] or []
-
-def get_db_connection():
-    db_path = Path(__file__).parent / "products.db"
-    conn = sqlite3.connect(db_path)
-    return conn
-
-def create_cache_table():
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("""
-        CREATE TABLE IF NOT EXISTS ingredient_cache (
-            dish_name TEXT PRIMARY KEY,
-            ingredients TEXT
-        )
-    """)
-    conn.commit()
-    conn.close()
+    return [match[0] for match in scored_matches[:MAX_MATCHES]] or []
+
+# Both create their tables on first use rather than at import
+_ingredient_cache = None
+_match_store = None
+_stores_lock = threading.Lock()
+
+def get_ingredient_cache():
+    global _ingredient_cache
+    if _ingredient_cache is None:
+        with _stores_lock:
+            if _ingredient_cache is None:
+                _ingredient_cache = IngredientCache(read_engine, write_engine)
+    return _ingredient_cache
+
+def get_match_store():
+    global _match_store
+    if _match_store is None:
+        with _stores_lock:
+            if _match_store is None:
+                _match_store = MatchStore(read_engine, write_engine)
+    return _match_store
+
+REGISTRY.collect_stats(
+    "htr_ingredient_cache", "Ingredient cache", lambda: _ingredient_cache.stats() if _ingredient_cache else {}
+)
+REGISTRY.collect_stats(
+    "htr_match_store", "Materialized match store", lambda: _match_store.stats() if _match_store else {}
+)
+REGISTRY.collect_stats("htr_llm", "LLM client", client_stats)
 
 def get_cached_ingredients(dish_name):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute("SELECT ingredients FROM ingredient_cache WHERE dish_name = ?", (dish_name,))
-    row = cursor.fetchone()
-    conn.close()
-    if row:
-        try:
-            return ast.literal_eval(row[0])
-        except Exception:
-            return None
-    return None
+    return get_ingredient_cache().get(dish_name)
 
 def set_cached_ingredients(dish_name, ingredients):
-    conn = get_db_connection()
-    cursor = conn.cursor()
-    cursor.execute(
-        "INSERT OR REPLACE INTO ingredient_cache (dish_name, ingredients) VALUES (?, ?)",
-        (dish_name, str(ingredients))
+    get_ingredient_cache().set(dish_name, ingredients)
+
+def build_ingredient_prompt(message):
+    return (
+        f"Analyze the following request: '{message}'. "
+        "If this is asking for ingredients to make a food item, recipe, dish, or any edible item, "
+        "then list the ingredients needed as a list of items enclosed in [ ] with each item in double quotes. "
+        "For each ingredient, only include it if it is a real food ingredient. "
+        "Exclude water as an ingredient and use basic ingredient names (e.g., 'chicken' not 'chicken breast'). "
+        "However, if the request is NOT about food, cooking, recipes, or any edible items "
+        "(e.g., if it's about objects, places, people, abstract concepts, non-edible items, etc.), "
+        "then respond with exactly: 'NON_FOOD_ITEM_DETECTED'. "
+        "Do not return anything else in either case."
     )
-    conn.commit()
-    conn.close()
 
-# Ensure cache table exists at startup
-create_cache_table()
+# Concurrent cache misses for the same dish share one LLM call
+ingredient_flights = SingleFlight()
+REGISTRY.collect_stats("htr_llm_flights", "Coalesced LLM calls", lambda: {
+    "leaders": ingredient_flights.leaders, "followers": ingredient_flights.followers,
+})
+
+async def fetch_ingredients(message, normalized_message):
+    with span("chat.llm"):
+        response_content = await get_llm_client().generate(build_ingredient_prompt(message))
+
+    # Check if LLM detected a non-food item
+    if response_content == "NON_FOOD_ITEM_DETECTED":
+        raise HTTPException(status_code=400, detail="Not a food item")
+
+    try:
+        ingredients = ast.literal_eval(response_content)
+    except Exception:
+        raise HTTPException(status_code=500, detail="Could not parse ingredients list from Gemini response.")
+
+    # Store in cache
+    await run_in_threadpool(set_cached_ingredients, normalized_message, ingredients)
+    return ingredients
+
+async def resolve_ingredients(message):
+    normalized_message = message.strip().lower()
+    # Check cache first
+    with span("chat.cache_lookup"):
+        ingredients = await run_in_threadpool(get_cached_ingredients, normalized_message)
+    if ingredients is None:
+        ingredients = await ingredient_flights.do(
+            normalized_message, lambda: fetch_ingredients(message, normalized_message)
+        )
+    return ingredients
+
+def valid_ingredients(ingredients):
+    return [
+        ingredient for ingredient in ingredients
+        if isinstance(ingredient, str) and ingredient.strip().lower() != "not a food item"
+    ]
+
+# Responses are assembled from the per-product JSON shared with the product
+# endpoints; the shapes are ChatResponse and BatchChatResponse
+def match_ingredients(ingredients):
+    ingredients = valid_ingredients(ingredients)
+    payloads = get_product_payloads()
+    matches = rank_products(ingredients)
+    return encode_ingredient_matches(payloads, [
+        (ingredient, matches[ingredient.strip().lower()]) for ingredient in ingredients
+    ])
+
+def match_dishes(dish_ingredients):
+    # Ingredients shared between dishes ("salt", "onion") are matched once
+    dish_ingredients = [valid_ingredients(ingredients) for ingredients in dish_ingredients]
+    payloads = get_product_payloads()
+    matches = rank_products([ingredient for ingredients in dish_ingredients for ingredient in ingredients])
+    return [
+        encode_ingredient_matches(payloads, [
+            (ingredient, matches[ingredient.strip().lower()]) for ingredient in ingredients
+        ])
+        for ingredients in dish_ingredients
+    ]
+
+def chat_error(error):
+    if isinstance(error, HTTPException):
+        return error  # Including our "Not a food item" error
+    if isinstance(error, asyncio.TimeoutError):
+        return HTTPException(status_code=504, detail="LLM request timed out")
+    logger.warning("LangChain Gemini error: %s", error)
+    return HTTPException(status_code=500, detail=f"LangChain Gemini\u00a0error:\u00a0{error}")
 
 @router.post("", response_model=ChatResponse)
-def chat_endpoint(request: ChatRequest):
-    api_key = os.getenv("GEMINI_API_KEY")
-    if not api_key:
-        raise HTTPException(status_code=500, detail="Gemini API key not set")
+async def chat_endpoint(request: ChatRequest):
+    try:
+        get_llm_client()
+    except RuntimeError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    try:
+        with span("chat.ingredients"):
+            ingredients = await resolve_ingredients(request.message)
+        # Matching is CPU-bound; keep it off the event loop
+        with span("chat.matching"):
+            ingredient_matches = await run_in_threadpool(match_ingredients, ingredients)
+        return json_response(b'{"ingredients":' + ingredient_matches + b"}")
+    except Exception as e:
+        raise chat_error(e)
+
+def chat_events(ingredients):
+    ingredients = valid_ingredients(ingredients)
+    yield sse_event("ingredients", dumps(ingredients))
+    payloads = get_product_payloads()
+    encoded = [None] * len(ingredients)
+    try:
+        for position, ingredient, products in stream_ranked_products(ingredients):
+            encoded[position] = encode_ingredient_match(payloads, ingredient, products)
+            # An IngredientMatch plus its position in the ingredients list
+            yield sse_event("match", b'{"index":' + str(position).encode() + b"," + encoded[position][1:])
+        yield sse_event("done", b'{"ingredients":[' + b",".join(encoded) + b"]}")
+    except Exception as e:
+        logger.warning("Chat stream error: %s", e)
+        yield sse_event("error", dumps({"detail": str(e)}))
+
+@router.post("/stream")
+async def chat_stream_endpoint(request: ChatRequest):
+    """Server-sent events variant of ``POST /api/chat``.
+
+    Emits ``ingredients`` (the parsed list) as soon as it is known, then one
+    ``match`` per ingredient as its matching completes (store hits first,
+    then cheapest first), and finally ``done`` with the same body
+    ``POST /api/chat`` returns. Errors before the first event are ordinary
+    HTTP errors; a failure while matching ends the stream with ``error``.
+    """
+    try:
+        get_llm_client()
+    except RuntimeError as e:
+        raise HTTPException(status_code=500, detail=str(e))
     try:
-        normalized_message = request.message.strip().lower()
-        # Check cache first
-        ingredients = get_cached_ingredients(normalized_message)
-        if ingredients is None:
-            llm = ChatGoogleGenerativeAI(
-                model="gemini-2.5-flash",
-                google_api_key=api_key,
-                temperature=0,
-            )
-            prompt = (
-                f"Analyze the following request: '{request.message}'. "
-                "If this is asking for ingredients to make a food item, recipe, dish, or any edible item, "
-                "then list the ingredients needed as a list of items enclosed in [ ] with each item in double quotes. "
-                "For each ingredient, only include it if it is a real food ingredient. "
-                "Exclude water as an ingredient and use basic ingredient names (e.g., 'chicken' not 'chicken breast'). "
-                "However, if the request is NOT about food, cooking, recipes, or any edible items "
-                "(e.g., if it's about objects, places, people, abstract concepts, non-edible items, etc.), "
-                "then respond with exactly: 'NON_FOOD_ITEM_DETECTED'. "
-                "Do not return anything else in either case."
-            )
-
-            response = llm.invoke(prompt)
-            response_content = response.content.strip()
-            
-            # Check if LLM detected a non-food item
-            if response_content == "NON_FOOD_ITEM_DETECTED":
-                raise HTTPException(status_code=400, detail="Not a food item")
-            
-            try:
-                ingredients = ast.literal_eval(response_content)
-            except Exception:
-                raise HTTPException(status_code=500, detail="Could not parse ingredients list from Gemini response.")
-
-            # Store in cache
-            set_cached_ingredients(normalized_message, ingredients)
-
-        all_products = get_all_products()
-        ingredient_matches = []
-        for ingredient in ingredients:
-            if isinstance(ingredient, str) and ingredient.strip().lower() != "not a food item":
-                matches = smart_ingredient_matching(ingredient, all_products)
-                ingredient_matches.append(IngredientMatch(ingredient=ingredient, matches=matches))
-        return ChatResponse(ingredients=ingredient_matches)
-    except HTTPException:
-        raise  # Re-raise HTTP exceptions (including our "Not a food item" error)
+        with span("chat.ingredients"):
+            ingredients = await resolve_ingredients(request.message)
     except Exception as e:
-        print("LangChain Gemini error:", e)
-        raise HTTPException(status_code=500, detail=f"LangChain Gemini\u00a0error:\u00a0{e}")
\ No newline at end of file
+        raise chat_error(e)
+    # A sync generator: StreamingResponse iterates it in the threadpool
+    return StreamingResponse(
+        chat_events(ingredients), media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+@router.post("/batch", response_model=BatchChatResponse)
+async def batch_chat_endpoint(request: BatchChatRequest):
+    try:
+        get_llm_client()
+    except RuntimeError as e:
+        raise HTTPException(status_code=500, detail=str(e))
+    resolved = await asyncio.gather(
+        *(resolve_ingredients(message) for message in request.messages), return_exceptions=True
+    )
+    for result in resolved:
+        if isinstance(result, BaseException) and not isinstance(result, Exception):
+            raise result
+    dish_matches = await run_in_threadpool(
+        match_dishes, [[] if isinstance(result, Exception) else result for result in resolved]
+    )
+    dishes = [
+        b'{"message":' + dumps(message) + b',"ingredients":'
+        + (b"[]" if isinstance(result, Exception) else matches)
+        + b',"error":' + dumps(str(chat_error(result).detail) if isinstance(result, Exception) else None) + b"}"
+        for message, result, matches in zip(request.messages, resolved, dish_matches)
+    ]
+    return json_response(b'{"dishes":[' + b",".join(dishes) + b"]}")
@@ -0,0 +1,74 @@
+"""Shared SQLite access for storage, the ingredient cache and the match store.
+
+Everything opens the same file, ``PRODUCTS_DB`` (default: products.db next to
+this module, whatever the working directory), through two engines:
+
+- ``read_engine`` pools connections for concurrent readers. In WAL mode they
+  never block on, or block, a writer in this process or another worker.
+  Connections are ``query_only`` so a stray write fails loudly instead of
+  taking the write lock from the read path.
+- ``write_engine`` holds a single connection, so writers in this process
+  queue on the pool instead of contending inside SQLite. Its transactions
+  open with BEGIN IMMEDIATE, so writers in other processes wait out
+  ``busy_timeout`` rather than failing with "database is locked" when a
+  read transaction tries to upgrade.
+"""
+import os
+from pathlib import Path
+
+from sqlalchemy import create_engine, event
+
+from metrics import instrument_engine
+
+DB_PATH = Path(os.getenv("PRODUCTS_DB", Path(__file__).parent / "products.db")).resolve()
+DATABASE_URL = f"sqlite:///{DB_PATH}"
+
+BUSY_TIMEOUT_MS = int(os.getenv("SQLITE_BUSY_TIMEOUT_MS", "10000"))
+READ_POOL_SIZE = int(os.getenv("SQLITE_READ_POOL_SIZE", "8"))
+
+PRAGMAS = (
+    f"PRAGMA busy_timeout = {BUSY_TIMEOUT_MS}",  # first, so the WAL switch below can wait too
+    "PRAGMA journal_mode = WAL",
+    "PRAGMA synchronous = NORMAL",  # fsync at checkpoints, not on every commit; safe with WAL
+    "PRAGMA cache_size = -32000",  # 32 MB page cache per connection
+    "PRAGMA mmap_size = 268435456",  # 256 MB memory-mapped reads
+    "PRAGMA temp_store = MEMORY",
+)
+
+
+def configure_engine(engine, begin, query_only=False):
+    @event.listens_for(engine, "connect")
+    def on_connect(dbapi_connection, connection_record):
+        # Stop pysqlite issuing its own BEGIN so the "begin" hook below decides
+        dbapi_connection.isolation_level = None
+        cursor = dbapi_connection.cursor()
+        for pragma in PRAGMAS:
+            cursor.execute(pragma)
+        if query_only:
+            cursor.execute("PRAGMA query_only = ON")
+        cursor.close()
+
+    @event.listens_for(engine, "begin")
+    def on_begin(conn):
+        conn.exec_driver_sql(begin)
+
+    return engine
+
+
+def create_engines(url=DATABASE_URL, read_pool_size=READ_POOL_SIZE):
+    """Return ``(read_engine, write_engine)`` for the SQLite database at ``url``."""
+    connect_args = {"check_same_thread": False, "timeout": BUSY_TIMEOUT_MS / 1000}
+    read = configure_engine(
+        create_engine(url, connect_args=connect_args, pool_size=read_pool_size, max_overflow=read_pool_size),
+        "BEGIN", query_only=True,
+    )
+    write = configure_engine(
+        create_engine(url, connect_args=connect_args, pool_size=1, max_overflow=0, pool_timeout=60),
+        "BEGIN IMMEDIATE",
+    )
+    return read, write
+
+
+read_engine, write_engine = create_engines()
+instrument_engine(read_engine)
+instrument_engine(write_engine)
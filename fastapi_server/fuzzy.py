@@ -0,0 +1,158 @@
+"""Character-trigram index over catalog words for typo-tolerant lookups.
+
+Words from product names and brands are split into pg_trgm-style trigrams
+("tumeric" -> "  t", " tu", "tum", ..., "ic "). A query word only visits the
+vocabulary words that share at least one trigram with it, so corrections
+cost a handful of posting lists rather than a pass over the catalog, and
+candidates are ranked by trigram Jaccard similarity.
+"""
+import copy
+import os
+import re
+import threading
+from bisect import bisect_left, insort
+from collections import Counter, defaultdict
+
+from catalog import get_catalog
+
+FUZZY_THRESHOLD = float(os.getenv("FUZZY_THRESHOLD", "0.3"))
+# Trigrams in more vocabulary words than this carry no signal ("ed ", "  s")
+# and are skipped when counting
+MAX_POSTING_FRACTION = 0.1
+WORD = re.compile(r"[^\W\d_]{3,}")
+
+
+def words(text):
+    return WORD.findall(text.lower())
+
+
+def trigrams(word):
+    padded = f"  {word} "
+    return {padded[i:i + 3] for i in range(len(padded) - 2)}
+
+
+class TrigramIndex:
+    def __init__(self, texts):
+        frequency = Counter()
+        for text in texts:
+            frequency.update(set(words(text)))
+        self.frequency = frequency
+        # Term ids index vocabulary, grams and postings; words added later get
+        # new ids at the end, and words no text uses any more keep theirs
+        # with a zero frequency. ``known`` bisects the sorted live words.
+        self.vocabulary = sorted(frequency)
+        self.live = self.vocabulary
+        self.term_ids = {word: term for term, word in enumerate(self.vocabulary)}
+        self.grams = [trigrams(word) for word in self.vocabulary]
+        postings = defaultdict(list)
+        for term, grams in enumerate(self.grams):
+            for gram in grams:
+                postings[gram].append(term)
+        self.postings = dict(postings)
+        self.max_postings = max(1, int(len(self.vocabulary) * MAX_POSTING_FRACTION))
+
+    def __len__(self):
+        return len(self.live)
+
+    def updated(self, removed, added):
+        """A copy with the words of the ``removed`` texts taken out and those of ``added`` put in.
+
+        Only the affected words are re-indexed; the rest is shared or
+        shallow-copied, and this index is left as it was for its readers.
+        """
+        index = copy.copy(self)
+        frequency = index.frequency = Counter(self.frequency)
+        live = index.live = list(self.live)
+        index.vocabulary = list(self.vocabulary)
+        index.term_ids = dict(self.term_ids)
+        index.grams = list(self.grams)
+        index.postings = dict(self.postings)
+        for text in removed:
+            for word in set(words(text)):
+                frequency[word] -= 1
+                if frequency[word] <= 0:
+                    del frequency[word]
+                    del live[bisect_left(live, word)]
+        for text in added:
+            for word in set(words(text)):
+                frequency[word] += 1
+                if frequency[word] == 1:
+                    insort(live, word)
+                if word not in index.term_ids:
+                    term = index.term_ids[word] = len(index.vocabulary)
+                    index.vocabulary.append(word)
+                    index.grams.append(trigrams(word))
+                    for gram in index.grams[term]:
+                        index.postings[gram] = index.postings.get(gram, []) + [term]
+        index.max_postings = max(1, int(len(index.vocabulary) * MAX_POSTING_FRACTION))
+        return index
+
+    def known(self, word):
+        """True when some catalog word starts with ``word`` (what a prefix search would hit)."""
+        position = bisect_left(self.live, word)
+        return position < len(self.live) and self.live[position].startswith(word)
+
+    def similar(self, word, threshold=FUZZY_THRESHOLD, limit=3):
+        """Up to ``limit`` ``(term, similarity)`` pairs, most similar (then most common) first."""
+        grams = trigrams(word)
+        shared = Counter()
+        for gram in grams:
+            terms = self.postings.get(gram, ())
+            if len(terms) <= self.max_postings:
+                shared.update(terms)
+        scored = []
+        for term, count in shared.items():
+            similarity = count / (len(grams) + len(self.grams[term]) - count)
+            term_word = self.vocabulary[term]
+            if similarity >= threshold and term_word != word and self.frequency[term_word]:
+                scored.append((similarity, self.frequency[term_word], term_word))
+        scored.sort(key=lambda item: (-item[0], -item[1], item[2]))
+        return [(term, similarity) for similarity, _, term in scored[:limit]]
+
+    def corrections(self, text, limit=3):
+        """Map each word of ``text`` that no catalog word starts with to its closest terms."""
+        result = {}
+        for word in dict.fromkeys(words(text)):
+            if not self.known(word):
+                similar = [term for term, _ in self.similar(word, limit=limit)]
+                if similar:
+                    result[word] = similar
+        return result
+
+    def correct(self, text):
+        """``text`` with each unknown word replaced by its best correction, or None if nothing changed."""
+        corrections = self.corrections(text, limit=1)
+        if not corrections:
+            return None
+        return WORD.sub(lambda match: corrections.get(match.group(0), [match.group(0)])[0], text.lower())
+
+
+def product_texts(products):
+    return [text for product in products if product is not None for text in (product.productName, product.brand)]
+
+
+_index = None
+_index_catalog = None
+_index_lock = threading.Lock()
+
+
+def get_term_index():
+    """Trigram index over the current catalog's product names and brands.
+
+    Catalog writes update it for the changed products only; a new catalog
+    file rebuilds it.
+    """
+    global _index, _index_catalog
+    catalog = get_catalog()
+    if _index_catalog is None or _index_catalog.version != catalog.version:
+        with _index_lock:
+            if _index_catalog is None or _index_catalog.version != catalog.version:
+                changes = catalog.changes_since(_index_catalog)
+                if changes is None:
+                    _index = TrigramIndex(product_texts(catalog.products))
+                else:
+                    _index = _index.updated(
+                        product_texts(old for old, _ in changes), product_texts(new for _, new in changes)
+                    )
+                _index_catalog = catalog
+    return _index
@@ -0,0 +1,259 @@
+"""Streaming, incremental product catalog import.
+
+Usage:
+    python importer.py [CSV_PATH] [--batch-size N] [--prune] [--force] [--database URL]
+
+Rows are read and written in fixed-size batches with core executemany
+upserts, so memory stays bounded regardless of catalog size. Each batch is
+diffed against the stored rows by ProductID and row hash and only new or
+changed rows are written. The file wins over products created, updated or
+deleted through the API: each import starts a new generation and compacts
+the ``catalog_changes`` log, whose entries were made against the previous one.
+"""
+import argparse
+import csv
+import hashlib
+import re
+import time
+import uuid
+from itertools import islice
+from pathlib import Path
+
+from sqlalchemy import bindparam, select, text
+from sqlalchemy.dialects.sqlite import insert as sqlite_insert
+
+from catalog import CSV_COLUMNS, file_version, find_catalog_csv
+from catalog_changes import GENERATION_KEY, compact_changes
+from database import DATABASE_URL, create_engines
+from models import Base, ProductDB
+
+DEFAULT_BATCH_SIZE = 500
+FIELDS = list(CSV_COLUMNS.values())
+PRICE_FIELDS = ["sale_price", "discount_amount", "discount_pct"]
+PRICE_NUMBER = re.compile(r"\d+(?:\.\d+)?")
+
+
+def row_hash(row):
+    return hashlib.sha1("\x1f".join(row[field] or "" for field in FIELDS).encode("utf-8")).digest()
+
+
+def parse_price(value):
+    # "₹1,299.00" -> 1299.0; None when there is no number at all
+    match = PRICE_NUMBER.search((value or "").replace(",", ""))
+    return float(match.group()) if match else None
+
+
+def price_fields(row):
+    """Numeric sale price, discount and discount percentage for one product row."""
+    price = parse_price(row.get("price"))
+    sale_price = parse_price(row.get("discountPrice"))
+    if sale_price is None:
+        sale_price = price
+    if price is None or sale_price is None:
+        return {"sale_price": sale_price, "discount_amount": None, "discount_pct": None}
+    discount = max(price - sale_price, 0.0)
+    return {
+        "sale_price": sale_price,
+        "discount_amount": round(discount, 2),
+        "discount_pct": round(discount / price * 100, 2) if price else 0.0,
+    }
+
+
+def iter_csv_rows(path):
+    with open(path, newline='', encoding='utf-8') as csvfile:
+        for row in csv.DictReader(csvfile):
+            yield {field: row[column] for column, field in CSV_COLUMNS.items()}
+
+
+def batched(iterable, size):
+    iterator = iter(iterable)
+    while batch := list(islice(iterator, size)):
+        yield batch
+
+
+class ImportStats:
+    __slots__ = ("rows", "inserted", "updated", "unchanged", "deleted", "batches", "seconds")
+
+    def __init__(self):
+        self.rows = self.inserted = self.updated = self.unchanged = self.deleted = self.batches = 0
+        self.seconds = 0.0
+
+    @property
+    def rows_per_second(self):
+        return self.rows / self.seconds if self.seconds else 0.0
+
+    def as_dict(self):
+        stats = {field: getattr(self, field) for field in self.__slots__}
+        stats["rows_per_second"] = round(self.rows_per_second, 1)
+        return stats
+
+    def __str__(self):
+        return (
+            f"{self.rows} rows ({self.inserted} inserted, {self.updated} updated, "
+            f"{self.unchanged} unchanged, {self.deleted} deleted) in {self.batches} batches, "
+            f"{self.seconds:.2f}s, {self.rows_per_second:.0f} rows/s"
+        )
+
+
+def create_meta_table(conn):
+    conn.execute(text("""
+        CREATE TABLE IF NOT EXISTS catalog_meta (
+            key TEXT PRIMARY KEY,
+            value TEXT
+        )
+    """))
+
+
+def ensure_price_columns(engine, batch_size=DEFAULT_BATCH_SIZE):
+    """Add the numeric price columns to an older products table and backfill them.
+
+    Stored rows hash the same as before, so the incremental import would
+    never rewrite them; they are filled in here, once, when the columns
+    are first added.
+    """
+    with engine.begin() as conn:
+        columns = {row[1] for row in conn.execute(text("PRAGMA table_info(products)"))}
+        missing = [field for field in PRICE_FIELDS if field not in columns]
+        for field in missing:
+            conn.execute(text(f"ALTER TABLE products ADD COLUMN {field} REAL"))
+    if not missing:
+        return 0
+    table = ProductDB.__table__
+    with engine.connect() as conn:
+        rows = [dict(row._mapping) for row in conn.execute(select(table.c.id, table.c.price, table.c.discountPrice))]
+    update = table.update().where(table.c.id == bindparam("product_id")).values(
+        {field: bindparam(field) for field in PRICE_FIELDS}
+    )
+    for batch in batched(rows, batch_size):
+        with engine.begin() as conn:
+            conn.execute(update, [{"product_id": row["id"], **price_fields(row)} for row in batch])
+    return len(rows)
+
+
+def get_imported_version(engine, source):
+    with engine.begin() as conn:
+        create_meta_table(conn)
+        row = conn.execute(
+            text("SELECT value FROM catalog_meta WHERE key = :key"),
+            {"key": f"import:{source}"}
+        ).fetchone()
+    return row[0] if row else None
+
+
+def set_imported_version(engine, source, version):
+    # Also starts a new import generation, which is what cached product
+    # responses key on: the rows changed, whichever file they came from.
+    # Change-log entries made against earlier imports are dropped with it
+    generation = uuid.uuid4().hex[:16]
+    with engine.begin() as conn:
+        create_meta_table(conn)
+        compact_changes(conn, generation)
+        conn.execute(
+            text("INSERT OR REPLACE INTO catalog_meta (key, value) VALUES (:key, :value)"),
+            [
+                {"key": f"import:{source}", "value": version},
+                {"key": GENERATION_KEY, "value": generation},
+            ]
+        )
+
+
+def upsert_statement():
+    # Insert-or-replace of every catalog and price column, keyed by product id
+    table = ProductDB.__table__
+    upsert = sqlite_insert(table)
+    return upsert.on_conflict_do_update(
+        index_elements=[table.c.id],
+        set_={field: upsert.excluded[field] for field in FIELDS + PRICE_FIELDS if field != "id"},
+    )
+
+
+def import_rows(engine, rows, batch_size=DEFAULT_BATCH_SIZE, prune=False):
+    """Upsert ``rows`` (dicts keyed by ProductDB column) and return ImportStats.
+
+    Each batch commits on its own so readers and cart writers are only
+    blocked for one batch at a time. With ``prune``, products whose id was
+    not seen in ``rows`` are deleted afterwards.
+    """
+    table = ProductDB.__table__
+    upsert = upsert_statement()
+    columns = [table.c[field] for field in FIELDS]
+    stats = ImportStats()
+    seen = set() if prune else None
+    started = time.perf_counter()
+
+    for batch in batched(rows, batch_size):
+        # Last row wins if an id repeats inside one batch
+        incoming = {row["id"]: row for row in batch}
+        with engine.begin() as conn:
+            existing = {
+                row.id: row_hash(row._mapping)
+                for row in conn.execute(select(*columns).where(table.c.id.in_(list(incoming))))
+            }
+            changed = []
+            for product_id, row in incoming.items():
+                old_hash = existing.get(product_id)
+                if old_hash is None:
+                    stats.inserted += 1
+                    changed.append({**row, **price_fields(row)})
+                elif old_hash != row_hash(row):
+                    stats.updated += 1
+                    changed.append({**row, **price_fields(row)})
+                else:
+                    stats.unchanged += 1
+            if changed:
+                conn.execute(upsert, changed)
+        stats.rows += len(batch)
+        stats.batches += 1
+        if seen is not None:
+            seen.update(incoming)
+
+    if seen is not None:
+        with engine.connect() as conn:
+            stale = [product_id for product_id in conn.execute(select(table.c.id)).scalars() if product_id not in seen]
+        for batch in batched(stale, batch_size):
+            with engine.begin() as conn:
+                conn.execute(table.delete().where(table.c.id.in_(batch)))
+            stats.deleted += len(batch)
+
+    stats.seconds = time.perf_counter() - started
+    return stats
+
+
+def import_catalog(engine, rows, source, version, batch_size=DEFAULT_BATCH_SIZE, prune=False, force=False):
+    """Import ``rows`` unless this ``version`` of ``source`` is already loaded.
+
+    Returns ImportStats, or None when the import was skipped.
+    """
+    source = str(Path(source).resolve())
+    if not force and get_imported_version(engine, source) == version:
+        return None
+    stats = import_rows(engine, rows, batch_size=batch_size, prune=prune)
+    set_imported_version(engine, source, version)
+    return stats
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description="Import a product catalog CSV into the products table.")
+    parser.add_argument("csv_path", nargs="?", help="catalog CSV (defaults to the bundled bigbasket_products.csv)")
+    parser.add_argument("--batch-size", type=int, default=DEFAULT_BATCH_SIZE)
+    parser.add_argument("--prune", action="store_true", help="delete products missing from the CSV")
+    parser.add_argument("--force", action="store_true", help="import even if this file version was already loaded")
+    parser.add_argument("--database", default=DATABASE_URL, help="defaults to PRODUCTS_DB")
+    args = parser.parse_args(argv)
+
+    path = Path(args.csv_path) if args.csv_path else find_catalog_csv()
+    _, engine = create_engines(args.database)
+    Base.metadata.create_all(bind=engine)
+    ensure_price_columns(engine)
+    stats = import_catalog(
+        engine, iter_csv_rows(path), path, file_version(path),
+        batch_size=args.batch_size, prune=args.prune, force=args.force,
+    )
+    if stats is None:
+        print(f"{path} is already imported (use --force to re-import)")
+    else:
+        print(f"Imported {path}: {stats}")
+
+
+if __name__ == "__main__":
+    main()
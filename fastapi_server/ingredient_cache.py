@@ -0,0 +1,179 @@
+import ast
+import json
+import threading
+import time
+from collections import Counter, OrderedDict
+
+DEFAULT_MEMORY_ENTRIES = 1024
+DEFAULT_TTL_SECONDS = 30 * 24 * 3600
+DEFAULT_MAX_ROWS = 50000
+# The persistent tier is trimmed once every this many writes, not on each one
+PRUNE_EVERY = 100
+
+
+class IngredientCache:
+    """Dish -> ingredient list cache: in-process LRU in front of a SQLite table.
+
+    Entries are JSON encoded and carry their own expiry. Popular dishes are
+    answered from memory; misses fall through to the ``ingredient_cache``
+    table over one shared connection, and hits there are promoted back into
+    memory. The table is capped at ``max_rows``, dropping least recently used
+    rows first. Table reads use the pooled read engine and writes the
+    serialized write engine; the lock only guards the in-memory tier.
+    """
+
+    def __init__(self, read_engine, write_engine, max_entries=DEFAULT_MEMORY_ENTRIES, ttl=DEFAULT_TTL_SECONDS,
+                 max_rows=DEFAULT_MAX_ROWS):
+        self.max_entries = max_entries
+        self.ttl = ttl
+        self.max_rows = max_rows
+        self._memory = OrderedDict()
+        self._lock = threading.Lock()
+        self._read = read_engine
+        self._write = write_engine
+        self._writes = 0
+        self.hits = 0
+        self.disk_hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.disk_evictions = 0
+        self.expirations = 0
+        self.create_table()
+
+    def create_table(self):
+        with self._write.begin() as conn:
+            conn.exec_driver_sql("""
+                CREATE TABLE IF NOT EXISTS ingredient_cache (
+                    dish_name TEXT PRIMARY KEY,
+                    ingredients TEXT
+                )
+            """)
+            columns = {row[1] for row in conn.exec_driver_sql("PRAGMA table_info(ingredient_cache)")}
+            # Tables created before the TTL/LRU columns existed are upgraded in place
+            for column in ("expires_at", "last_used"):
+                if column not in columns:
+                    conn.exec_driver_sql(f"ALTER TABLE ingredient_cache ADD COLUMN {column} REAL")
+            conn.exec_driver_sql(
+                "CREATE INDEX IF NOT EXISTS ix_ingredient_cache_last_used ON ingredient_cache(last_used)"
+            )
+
+    def get(self, key):
+        now = time.time()
+        with self._lock:
+            entry = self._memory.get(key)
+            if entry is not None:
+                expires_at, value = entry
+                if expires_at is None or expires_at > now:
+                    self._memory.move_to_end(key)
+                    self.hits += 1
+                    return value
+                del self._memory[key]
+
+        with self._read.connect() as conn:
+            row = conn.exec_driver_sql(
+                "SELECT ingredients, expires_at FROM ingredient_cache WHERE dish_name = ?", (key,)
+            ).fetchone()
+        if row is None:
+            with self._lock:
+                self.misses += 1
+            return None
+        encoded, expires_at = row
+        if expires_at is not None and expires_at <= now:
+            with self._write.begin() as conn:
+                conn.exec_driver_sql("DELETE FROM ingredient_cache WHERE dish_name = ?", (key,))
+            with self._lock:
+                self.expirations += 1
+                self.misses += 1
+            return None
+        value = self._decode(encoded)
+        if value is None:
+            with self._lock:
+                self.misses += 1
+            return None
+        with self._write.begin() as conn:
+            conn.exec_driver_sql("UPDATE ingredient_cache SET last_used = ? WHERE dish_name = ?", (now, key))
+        with self._lock:
+            self._remember(key, expires_at, value)
+            self.disk_hits += 1
+        return value
+
+    def set(self, key, value, ttl=None):
+        now = time.time()
+        ttl = self.ttl if ttl is None else ttl
+        expires_at = now + ttl if ttl else None
+        with self._lock:
+            self._remember(key, expires_at, value)
+            self._writes += 1
+            prune = self._writes % PRUNE_EVERY == 0
+        with self._write.begin() as conn:
+            conn.exec_driver_sql(
+                "INSERT OR REPLACE INTO ingredient_cache (dish_name, ingredients, expires_at, last_used) VALUES (?, ?, ?, ?)",
+                (key, json.dumps(value), expires_at, now)
+            )
+        if prune:
+            self._prune(now)
+
+    def top_ingredients(self, limit):
+        """Most common normalized ingredients across every cached dish."""
+        with self._read.connect() as conn:
+            rows = conn.exec_driver_sql("SELECT ingredients FROM ingredient_cache").fetchall()
+        counts = Counter()
+        for (encoded,) in rows:
+            value = self._decode(encoded)
+            if isinstance(value, list):
+                counts.update({item.strip().lower() for item in value if isinstance(item, str)})
+        return [ingredient for ingredient, _ in counts.most_common(limit)]
+
+    def clear_memory(self):
+        with self._lock:
+            self._memory.clear()
+
+    def stats(self):
+        lookups = self.hits + self.disk_hits + self.misses
+        return {
+            "memory_entries": len(self._memory),
+            "hits": self.hits,
+            "disk_hits": self.disk_hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "disk_evictions": self.disk_evictions,
+            "expirations": self.expirations,
+            "hit_ratio": (self.hits + self.disk_hits) / lookups if lookups else 0.0,
+        }
+
+    def _remember(self, key, expires_at, value):
+        self._memory[key] = (expires_at, value)
+        self._memory.move_to_end(key)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.evictions += 1
+
+    def _prune(self, now):
+        with self._write.begin() as conn:
+            expired = conn.exec_driver_sql(
+                "DELETE FROM ingredient_cache WHERE expires_at IS NOT NULL AND expires_at <= ?", (now,)
+            ).rowcount
+            (count,) = conn.exec_driver_sql("SELECT COUNT(*) FROM ingredient_cache").fetchone()
+            overflow = count - self.max_rows
+            evicted = 0
+            if overflow > 0:
+                evicted = conn.exec_driver_sql("""
+                    DELETE FROM ingredient_cache WHERE dish_name IN (
+                        SELECT dish_name FROM ingredient_cache ORDER BY COALESCE(last_used, 0) LIMIT ?
+                    )
+                """, (overflow,)).rowcount
+        with self._lock:
+            self.expirations += expired
+            self.disk_evictions += evicted
+
+    @staticmethod
+    def _decode(encoded):
+        try:
+            return json.loads(encoded)
+        except ValueError:
+            pass
+        # Rows written before JSON encoding used str(list)
+        try:
+            return ast.literal_eval(encoded)
+        except Exception:
+            return None
@@ -0,0 +1,163 @@
+import asyncio
+import hashlib
+import json
+import os
+
+GEMINI_MODEL = "gemini-2.5-flash"
+DEFAULT_MAX_CONCURRENCY = 8
+DEFAULT_TIMEOUT_SECONDS = 30.0
+
+
+class LLMProvider:
+    """Minimal interface the chat path needs from a language model."""
+
+    name = "base"
+
+    async def generate(self, prompt: str) -> str:
+        raise NotImplementedError
+
+
+class GeminiProvider(LLMProvider):
+    name = "gemini"
+
+    def __init__(self, api_key, model=GEMINI_MODEL):
+        from langchain_google_genai import ChatGoogleGenerativeAI
+
+        self._llm = ChatGoogleGenerativeAI(model=model, google_api_key=api_key, temperature=0)
+
+    async def generate(self, prompt: str) -> str:
+        response = await self._llm.ainvoke(prompt)
+        return response.content.strip()
+
+
+class StubProvider(LLMProvider):
+    """Deterministic offline provider for tests and load tests.
+
+    The same prompt always yields the same ingredient list, picked from
+    ``vocabulary`` by a stable hash, after sleeping ``latency`` seconds to
+    stand in for the network round trip.
+    """
+
+    name = "stub"
+
+    def __init__(self, latency=0.0, vocabulary=None, min_items=3, max_items=8):
+        if vocabulary is None:
+            from matching import get_ingredient_synonyms
+
+            vocabulary = sorted(get_ingredient_synonyms())
+        self.latency = latency
+        self.vocabulary = list(vocabulary)
+        self.min_items = min_items
+        self.max_items = max_items
+
+    async def generate(self, prompt: str) -> str:
+        if self.latency:
+            await asyncio.sleep(self.latency)
+        seed = int.from_bytes(hashlib.sha1(prompt.encode("utf-8")).digest()[:8], "big")
+        count = self.min_items + seed % (self.max_items - self.min_items + 1)
+        picked = []
+        for i in range(count):
+            item = self.vocabulary[(seed >> (i * 5)) % len(self.vocabulary)]
+            if item not in picked:
+                picked.append(item)
+        return json.dumps(picked)
+
+
+def create_provider(name=None):
+    name = name or os.getenv("LLM_PROVIDER", "gemini")
+    if name == "stub":
+        return StubProvider(latency=float(os.getenv("STUB_LLM_LATENCY", "0")))
+    if name == "gemini":
+        api_key = os.getenv("GEMINI_API_KEY")
+        if not api_key:
+            raise RuntimeError("Gemini API key not set")
+        return GeminiProvider(api_key)
+    raise ValueError(f"Unknown LLM provider: {name}")
+
+
+class SingleFlight:
+    """Coalesces concurrent calls that share a key into one in-flight task.
+
+    The shared work runs as its own task, so a caller that disconnects does
+    not cancel it for the others still waiting.
+    """
+
+    def __init__(self):
+        self._inflight = {}
+        self.leaders = 0
+        self.followers = 0
+
+    async def do(self, key, factory):
+        task = self._inflight.get(key)
+        if task is None:
+            self.leaders += 1
+            task = asyncio.ensure_future(factory())
+            self._inflight[key] = task
+            task.add_done_callback(lambda done: self._finish(key, done))
+        else:
+            self.followers += 1
+        return await asyncio.shield(task)
+
+    def _finish(self, key, task):
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            # Mark the exception retrieved even if every waiter went away
+            task.exception()
+
+
+class LLMClient:
+    """Long-lived client with bounded concurrency and a per-call timeout."""
+
+    def __init__(self, provider, max_concurrency=DEFAULT_MAX_CONCURRENCY, timeout=DEFAULT_TIMEOUT_SECONDS):
+        self.provider = provider
+        self.timeout = timeout
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.calls = 0
+        self.errors = 0
+        self.timeouts = 0
+
+    async def generate(self, prompt: str) -> str:
+        async with self._semaphore:
+            self.calls += 1
+            try:
+                return await asyncio.wait_for(self.provider.generate(prompt), self.timeout)
+            except asyncio.TimeoutError:
+                self.timeouts += 1
+                raise
+            except Exception:
+                self.errors += 1
+                raise
+
+    def stats(self):
+        return {
+            "provider": self.provider.name,
+            "calls": self.calls,
+            "errors": self.errors,
+            "timeouts": self.timeouts,
+        }
+
+
+_client = None
+
+
+def get_llm_client():
+    global _client
+    if _client is None:
+        _client = LLMClient(
+            create_provider(),
+            max_concurrency=int(os.getenv("LLM_MAX_CONCURRENCY", DEFAULT_MAX_CONCURRENCY)),
+            timeout=float(os.getenv("LLM_TIMEOUT_SECONDS", DEFAULT_TIMEOUT_SECONDS)),
+        )
+    return _client
+
+
+def client_stats():
+    # Doesn't create the client, so scraping metrics never needs an API key
+    return _client.stats() if _client is not None else {}
+
+
+def set_llm_client(client):
+    """Swap the process-wide client, e.g. for a StubProvider in load tests."""
+    global _client
+    _client = client
@@ -1,13 +1,40 @@
-from fastapi import FastAPI, HTTPException, Query
-from typing import List
+import hmac
+import logging
+import os
+import threading
+from contextlib import asynccontextmanager
+from fastapi import Depends, FastAPI, Header, HTTPException, Query, Request, Response
+from pydantic import BaseModel, Field
+from typing import List, Literal, Optional
+from catalog import get_catalog_version
 from models import Product, ProductDB
-from storage import storage
+from storage import get_storage, sort_cursor
 from fastapi.middleware.cors import CORSMiddleware
-from chat import router as chat_router
+from chat import router as chat_router, start_match_warmup, start_matching_pool
 from cart import router as cart_router
-from fastapi.responses import FileResponse
+from fastapi.middleware.gzip import GZipMiddleware
+from fastapi.responses import FileResponse, PlainTextResponse, StreamingResponse
+from metrics import CONTENT_TYPE, REGISTRY, MetricsMiddleware
+from serialization import (
+    GZIP_LEVEL, GZIP_MIN_SIZE, catalog_response, dumps, get_product_payloads, response_cache,
+)
+
+# Startup reports (catalog import counts and throughput, match warm-up) are
+# logged at INFO. A no-op when the server's own logging config got there first
+logging.basicConfig(level=os.getenv("LOG_LEVEL", "INFO").upper(), format="%(levelname)s:     %(name)s: %(message)s")
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Nothing heavy runs at import. Storage (schema, catalog import, FTS index)
+    # initializes in the background so the server accepts requests right away;
+    # handlers that need it wait in get_storage(). Serverless runtimes that skip
+    # lifespan get the same initialization on first use.
+    threading.Thread(target=get_storage, name="storage-init", daemon=True).start()
+    start_matching_pool()
+    start_match_warmup()
+    yield
 
-app = FastAPI()
+app = FastAPI(lifespan=lifespan)
 
 # ✅ Updated CORS: allow only the frontend origin
 app.add_middleware(
@@ -16,7 +43,15 @@ app.add_middleware(
     allow_credentials=True,
     allow_methods=["*"],
     allow_headers=["*"],
+    expose_headers=["X-Next-Cursor"],
 )
+# Compresses large chat and streaming responses; cached catalog responses
+# arrive already gzipped and are passed through
+app.add_middleware(GZipMiddleware, minimum_size=GZIP_MIN_SIZE, compresslevel=GZIP_LEVEL)
+# Added last so it is outermost and times CORS handling too
+app.add_middleware(MetricsMiddleware)
+REGISTRY.collect_stats("htr_response_cache", "Catalog response cache", response_cache.stats)
+
 @app.get("/")
 def root():
     return {"message": "HackTheRecipe API is running"}
@@ -26,22 +61,152 @@ def favicon():
     # Optionally, serve a favicon file if you have one
     return FileResponse("favicon.ico", media_type="image/x-icon")
 
+@app.get("/metrics", include_in_schema=False)
+def get_metrics():
+    # Prometheus text exposition format
+    return PlainTextResponse(REGISTRY.render(), media_type=CONTENT_TYPE)
+
 app.include_router(chat_router)
 
 app.include_router(cart_router)
 
+DEFAULT_PAGE_SIZE = 100
+MAX_PAGE_SIZE = 1000
+
+def ndjson_response(rows):
+    return StreamingResponse((dumps(row) + b"\n" for row in rows), media_type="application/x-ndjson")
+
+def stream_products(limit: Optional[int], after: Optional[str], **filters):
+    # A stream is the whole (filtered, sorted) listing; paging it makes no sense
+    if limit is not None or after is not None:
+        raise HTTPException(status_code=400, detail="stream=true can't be combined with limit or after")
+    return ndjson_response(get_storage().iter_products(**filters))
+
+def product_list(load):
+    # Product JSON is pre-encoded per product, so this is a byte join. The
+    # payloads are taken before load() reads, so a write racing the read
+    # can't leave old content cached
+    payloads = get_product_payloads()
+    return payloads.encode_list(load()), None
+
+def product_rows(load):
+    # The same for field-value tuples, which full listings select instead of ORM objects
+    payloads = get_product_payloads()
+    return payloads.encode_rows(load()), None
+
+def product_page(
+    limit: Optional[int], after: Optional[str], category: Optional[str] = None,
+    min_price: Optional[float] = None, max_price: Optional[float] = None, sort: Optional[str] = None,
+):
+    page_size = limit or DEFAULT_PAGE_SIZE
+    payloads = get_product_payloads()
+    try:
+        products = get_storage().get_products_page(
+            page_size, after=after, category=category, min_price=min_price, max_price=max_price, sort=sort,
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    # A full page means there may be more; clients pass this back as ?after=
+    if len(products) == page_size:
+        return payloads.encode_list(products), {"X-Next-Cursor": sort_cursor(products[-1], sort)}
+    return payloads.encode_list(products), None
+
+# price: cheapest first; discount / discount_pct: biggest saving first
+SortKey = Literal["price", "discount", "discount_pct"]
+
 @app.get("/api/products", response_model=List[Product])
-def get_all_products():
-    return [Product.model_validate(p) for p in storage.get_all_products()]
+def get_all_products(
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    min_price: Optional[float] = Query(None, ge=0),
+    max_price: Optional[float] = Query(None, ge=0),
+    sort: Optional[SortKey] = None,
+    stream: bool = False,
+):
+    if stream:
+        return stream_products(limit, after, min_price=min_price, max_price=max_price, sort=sort)
+    # Filtering or sorting always pages, so it never falls back to the full catalog
+    if any(value is not None for value in (limit, after, min_price, max_price, sort)):
+        return catalog_response(request, lambda: product_page(limit, after, None, min_price, max_price, sort))
+    return catalog_response(request, lambda: product_rows(get_storage().get_all_products))
 
 @app.get("/api/products/search", response_model=List[Product])
-def search_products(q: str = Query(...)):
-    return [Product.model_validate(p) for p in storage.search_products(q)]
+def search_products(
+    request: Request,
+    q: str = Query(...),
+    limit: Optional[int] = Query(None, ge=1),
+    mode: Literal["fts", "like"] = "fts",
+    min_price: Optional[float] = Query(None, ge=0),
+    max_price: Optional[float] = Query(None, ge=0),
+    sort: Optional[SortKey] = None,
+):
+    # "fts" returns BM25-ranked prefix matches; "like" is the original substring scan
+    return catalog_response(request, lambda: product_list(lambda: get_storage().search_products(
+        q, limit=limit, mode=mode, min_price=min_price, max_price=max_price, sort=sort,
+    )))
 
 @app.get("/api/products/category/{category}", response_model=List[Product])
-def get_products_by_category(category: str):
-    return [Product.model_validate(p) for p in storage.get_products_by_category(category)]
+def get_products_by_category(
+    category: str,
+    request: Request,
+    limit: Optional[int] = Query(None, ge=1, le=MAX_PAGE_SIZE),
+    after: Optional[str] = None,
+    min_price: Optional[float] = Query(None, ge=0),
+    max_price: Optional[float] = Query(None, ge=0),
+    sort: Optional[SortKey] = None,
+    stream: bool = False,
+):
+    if stream:
+        return stream_products(limit, after, category=category, min_price=min_price, max_price=max_price, sort=sort)
+    if any(value is not None for value in (limit, after, min_price, max_price, sort)):
+        return catalog_response(request, lambda: product_page(limit, after, category, min_price, max_price, sort))
+    return catalog_response(request, lambda: product_rows(lambda: get_storage().get_products_by_category(category)))
+
+# Catalog writes. Each one bumps the catalog version, so cached responses and
+# ETags move on, and the in-memory catalog, matching engine, spelling index,
+# product payloads and stored ingredient matches catch up on their next use
+# by applying just the changed products. Disabled unless CATALOG_ADMIN_TOKEN
+# is set; requests then need "Authorization: Bearer <token>".
+MAX_BULK_CHANGES = 10000
+
+class ProductChanges(BaseModel):
+    upsert: List[Product] = Field(default_factory=list, max_length=MAX_BULK_CHANGES)
+    delete: List[str] = Field(default_factory=list, max_length=MAX_BULK_CHANGES)
+
+def require_catalog_admin(authorization: Optional[str] = Header(None)):
+    token = os.getenv("CATALOG_ADMIN_TOKEN")
+    if not token:
+        raise HTTPException(status_code=403, detail="Catalog writes are disabled")
+    if not hmac.compare_digest(authorization or "", f"Bearer {token}"):
+        raise HTTPException(status_code=401, detail="Invalid catalog admin token")
+
+@app.post("/api/products", response_model=Product, status_code=201, dependencies=[Depends(require_catalog_admin)])
+def create_product(product: Product):
+    created = get_storage().create_product(product.model_dump())
+    if created is None:
+        raise HTTPException(status_code=409, detail=f"Product {product.id} already exists")
+    return created
+
+@app.put("/api/products/{product_id}", response_model=Product, dependencies=[Depends(require_catalog_admin)])
+def update_product(product_id: str, product: Product):
+    if product.id != product_id:
+        raise HTTPException(status_code=400, detail="Product id does not match the URL")
+    updated = get_storage().update_product(product_id, product.model_dump())
+    if updated is None:
+        raise HTTPException(status_code=404, detail="Product not found")
+    return updated
+
+@app.delete("/api/products/{product_id}", status_code=204, dependencies=[Depends(require_catalog_admin)])
+def delete_product(product_id: str):
+    if not get_storage().delete_product(product_id):
+        raise HTTPException(status_code=404, detail="Product not found")
+    return Response(status_code=204)
 
-# @app.post("/api/products", response_model=ProductDB)
-# def create_product(product: InsertProduct):
-#     return storage.create_product(product)
+@app.post("/api/products/bulk", dependencies=[Depends(require_catalog_admin)])
+def apply_product_changes(changes: ProductChanges):
+    # Upserts create or replace, then deletes run; one transaction, one new version
+    result = get_storage().apply_product_changes(
+        [product.model_dump() for product in changes.upsert], changes.delete
+    )
+    return {**result, "version": get_catalog_version()}
@@ -0,0 +1,156 @@
+import json
+import threading
+import time
+from collections import OrderedDict
+
+
+DEFAULT_MEMORY_ENTRIES = 10000
+
+
+class MatchStore:
+    """Materialized ingredient -> ranked product ids, tagged with a catalog version.
+
+    Lookups are served from an in-memory LRU for the current version and
+    fall back to the ``ingredient_matches`` table, so results survive
+    restarts. The first access under a new version drops every row computed
+    for an older one. The lock only guards the in-memory tier; table reads
+    and writes run outside it.
+
+    Within a version, each ranking also records the catalog revision it was
+    computed at. After catalog writes, a ranking from an older revision is
+    served only if ``unchanged(ingredient, product_ids, revision)`` confirms
+    none of the changed products can move it; the rest count as misses and
+    are recomputed.
+    """
+
+    def __init__(self, read_engine, write_engine, max_entries=DEFAULT_MEMORY_ENTRIES):
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+        self._read = read_engine
+        self._write = write_engine
+        self._version = None
+        self._memory = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+        self.evictions = 0
+        self.invalidations = 0
+        self.stale = 0
+        self.create_table()
+
+    def create_table(self):
+        with self._write.begin() as conn:
+            conn.exec_driver_sql("""
+                CREATE TABLE IF NOT EXISTS ingredient_matches (
+                    ingredient TEXT PRIMARY KEY,
+                    catalog_version TEXT,
+                    product_ids TEXT,
+                    computed_at REAL,
+                    revision INTEGER DEFAULT 0
+                )
+            """)
+            columns = {row[1] for row in conn.exec_driver_sql("PRAGMA table_info(ingredient_matches)")}
+            if "revision" not in columns:
+                conn.exec_driver_sql("ALTER TABLE ingredient_matches ADD COLUMN revision INTEGER DEFAULT 0")
+
+    def get_many(self, version, ingredients, revision=0, unchanged=None):
+        def usable(ingredient, entry):
+            product_ids, computed = entry
+            return computed == revision or (
+                computed < revision and unchanged is not None and unchanged(ingredient, product_ids, computed)
+            )
+
+        self._switch(version)
+        with self._lock:
+            cached = {ingredient: self._memory.get(ingredient) for ingredient in ingredients}
+        found = {}
+        outdated = {}
+        for ingredient, entry in cached.items():
+            if entry is None:
+                continue
+            if usable(ingredient, entry):
+                found[ingredient] = entry
+            elif entry[1] < revision:
+                outdated[ingredient] = entry
+        # Another worker may have stored a current ranking for what memory lacks
+        missing = [ingredient for ingredient in ingredients if ingredient not in found]
+        stale = len(outdated)
+        if missing:
+            placeholders = ", ".join("?" * len(missing))
+            with self._read.connect() as conn:
+                rows = conn.exec_driver_sql(
+                    f"SELECT ingredient, product_ids, revision FROM ingredient_matches "
+                    f"WHERE catalog_version = ? AND ingredient IN ({placeholders})",
+                    (version, *missing)
+                ).fetchall()
+            for ingredient, encoded, computed in rows:
+                entry = (json.loads(encoded), computed or 0)
+                if usable(ingredient, entry):
+                    found[ingredient] = entry
+                else:
+                    stale += 1
+
+        with self._lock:
+            if self._version == version:
+                for ingredient, entry in outdated.items():
+                    if self._memory.get(ingredient) is entry:
+                        del self._memory[ingredient]
+                for ingredient, (product_ids, _) in found.items():
+                    # Stamped with the caller's revision, unless a newer ranking arrived meanwhile
+                    entry = self._memory.get(ingredient)
+                    if entry is None or entry[1] <= revision:
+                        self._remember(ingredient, (product_ids, revision))
+            self.hits += len(found)
+            self.misses += len(ingredients) - len(found)
+            self.stale += stale
+        return {ingredient: product_ids for ingredient, (product_ids, _) in found.items()}
+
+    def put_many(self, version, matches, revision=0):
+        now = time.time()
+        self._switch(version)
+        with self._lock:
+            if self._version == version:
+                for ingredient, product_ids in matches.items():
+                    self._remember(ingredient, (product_ids, revision))
+        with self._write.begin() as conn:
+            conn.exec_driver_sql(
+                "INSERT OR REPLACE INTO ingredient_matches "
+                "(ingredient, catalog_version, product_ids, computed_at, revision) VALUES (?, ?, ?, ?, ?)",
+                [
+                    (ingredient, version, json.dumps(product_ids), now, revision)
+                    for ingredient, product_ids in matches.items()
+                ]
+            )
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "version": self._version,
+            "memory_entries": len(self._memory),
+            "hits": self.hits,
+            "misses": self.misses,
+            "evictions": self.evictions,
+            "invalidations": self.invalidations,
+            "stale": self.stale,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+    def _remember(self, ingredient, entry):
+        self._memory[ingredient] = entry
+        self._memory.move_to_end(ingredient)
+        while len(self._memory) > self.max_entries:
+            self._memory.popitem(last=False)
+            self.evictions += 1
+
+    def _switch(self, version):
+        with self._lock:
+            if version == self._version:
+                return
+            self._memory.clear()
+            self._version = version
+        with self._write.begin() as conn:
+            deleted = conn.exec_driver_sql(
+                "DELETE FROM ingredient_matches WHERE catalog_version != ?", (version,)
+            ).rowcount
+        if deleted:
+            with self._lock:
+                self.invalidations += 1
@@ -0,0 +1,365 @@
+import copy
+import os
+import re
+import threading
+from collections import defaultdict
+
+from fuzzy import TrigramIndex, words as fuzzy_words
+from rules import get_rules
+
+
+MAX_MATCHES = 8
+# Bump when ranking changes so materialized matches from older code are recomputed
+SCORING_REVISION = 2
+# Catalog updates an engine remembers the changed names of, for MatchingEngine.unaffected
+MAX_CHANGE_HISTORY = 1000
+# Per-product lists, one value per position, in MatchingEngine.normalize order
+COLUMNS = (
+    "names", "brands", "categories", "sub_categories", "name_words", "name_tokens",
+    "excluded", "preferred_category", "preferred_keyword",
+)
+
+
+def simple_tokenize(text):
+    text = re.sub(r'[^\w\s]', ' ', text.lower())
+    return [word for word in text.split() if len(word) > 2]
+
+
+def store_version(catalog_version, rules):
+    # Materialized matches depend on the catalog, the rules and the scoring code
+    return f"{catalog_version}-{rules.version}-r{SCORING_REVISION}"
+
+
+def get_ingredient_synonyms():
+    # Loaded from the rules file and hot-reloaded with it
+    return get_rules().synonyms
+
+
+_pattern_cache = {}
+
+def compile_variation(variation):
+    pattern = _pattern_cache.get(variation)
+    if pattern is None:
+        pattern = re.compile(r'\b' + re.escape(variation) + r'\b')
+        _pattern_cache[variation] = pattern
+    return pattern
+
+
+class MatchingEngine:
+    """Precomputed matcher over one catalog version.
+
+    Built from ``catalog.CatalogProduct`` records. Every product's name, brand,
+    category and subCategory are normalized once and the name/brand words go
+    into an inverted index. A variation can only score against a product whose
+    name or brand contains it as a substring, so ``match`` resolves candidates
+    through the index and scores just those, reproducing
+    ``chat.smart_ingredient_matching`` exactly. ``ranked_indices`` adds a
+    typo-tolerant fallback on top.
+    """
+
+    def __init__(self, products, version=None, rules=None, revision=0):
+        self.version = version
+        self.revision = revision
+        self.rules = rules or get_rules()
+        self.store_version = store_version(version, self.rules)
+        self.products = list(products)
+        columns = list(zip(*map(self.normalize, self.products))) or [()] * len(COLUMNS)
+        for column, values in zip(COLUMNS, columns):
+            setattr(self, column, list(values))
+
+        index = defaultdict(list)
+        for i in range(len(self.products)):
+            for word in self.index_keys(i):
+                index[word].append(i)
+        self.index = dict(index)
+        self.by_id = {product.id: product for product in self.products}
+        self.positions = {product.id: i for i, product in enumerate(self.products)}
+        # (revision, normalized names and brands it changed), oldest first
+        self.history = ()
+        self.history_start = revision
+        self._candidate_cache = {}
+        self._terms = None
+        self._terms_lock = threading.Lock()
+
+    def normalize(self, product):
+        """One product's values for ``COLUMNS``."""
+        name = product.productName.strip().lower()
+        brand = product.brand.strip().lower()
+        category = product.category.strip().lower()
+        sub_category = product.subCategory.strip().lower()
+        # One automaton pass per field instead of a substring scan per keyword
+        excluded, preferred_category, preferred_keyword = self.rules.product_flags(
+            name, brand, category, sub_category
+        )
+        return (
+            name, brand, category, sub_category, name.split(), frozenset(simple_tokenize(name)),
+            excluded, preferred_category, preferred_keyword,
+        )
+
+    def index_keys(self, i):
+        return set(self.name_words[i]) | set(self.brands[i].split())
+
+    def apply_changes(self, changes, revision):
+        """A new engine for catalog ``revision``: this one with ``changes`` applied.
+
+        ``changes`` are ``(old, new)`` product pairs from
+        ``CatalogSnapshot.changes_since``. Only the changed products are
+        normalized and re-indexed; everything else is shared or shallow-copied,
+        so readers of this engine are unaffected. An update keeps the
+        product's position, a create is appended and a delete leaves an empty
+        slot, so rankings are the ones a fresh build would give.
+        """
+        engine = copy.copy(self)
+        engine.revision = revision
+        engine._copy_for_update()
+        removed = []
+        added = []
+        for old, new in changes:
+            i = None
+            if old is not None:
+                i = engine.positions.pop(old.id)
+                removed += (engine.names[i], engine.brands[i])
+                engine._unindex(i)
+                engine.products[i] = None
+                del engine.by_id[old.id]
+            if new is not None:
+                if i is None:
+                    i = len(engine.products)
+                    engine._append_slot()
+                for column, value in zip(COLUMNS, engine.normalize(new)):
+                    getattr(engine, column)[i] = value
+                engine.products[i] = new
+                engine.by_id[new.id] = new
+                engine.positions[new.id] = i
+                engine._index(i)
+                added += (engine.names[i], engine.brands[i])
+        engine._changed(removed, added)
+        return engine
+
+    def _copy_for_update(self):
+        self.products = list(self.products)
+        for column in COLUMNS:
+            setattr(self, column, list(getattr(self, column)))
+        self.index = dict(self.index)
+        self.by_id = dict(self.by_id)
+        self.positions = dict(self.positions)
+        # Readers of the old engine keep filling its cache; _changed filters a copy
+        self._candidate_cache = dict(self._candidate_cache)
+
+    def _append_slot(self):
+        self.products.append(None)
+        for column in COLUMNS:
+            getattr(self, column).append(None)
+
+    def _index(self, i):
+        # Posting lists are shared with older engines, so they are replaced, never mutated
+        for word in self.index_keys(i):
+            self.index[word] = self.index.get(word, []) + [i]
+
+    def _unindex(self, i):
+        for word in self.index_keys(i):
+            postings = [j for j in self.index[word] if j != i]
+            if postings:
+                self.index[word] = postings
+            else:
+                del self.index[word]
+
+    def _changed(self, removed, added):
+        # Cached candidates stay valid for variations none of the changed names or brands contain
+        texts = tuple(removed + added)
+        self._candidate_cache = {
+            variation: candidates for variation, candidates in self._candidate_cache.items()
+            if not any(variation in text for text in texts)
+        }
+        self.history += ((self.revision, texts),)
+        if len(self.history) > MAX_CHANGE_HISTORY:
+            self.history_start = self.history[0][0]
+            self.history = self.history[1:]
+        if self._terms is not None:
+            self._terms = self._terms.updated(removed, added)
+        self._terms_lock = threading.Lock()
+
+    def variations(self, norm_ingredient):
+        return list(dict.fromkeys(self.rules.synonyms.get(norm_ingredient, [norm_ingredient]) + [norm_ingredient]))
+
+    def unaffected(self, ingredient, product_ids, revision):
+        """True when no change applied after ``revision`` can alter ``ingredient``'s ranking ``product_ids``.
+
+        A product only scores for an ingredient when one of its variations is
+        in the product's name or brand, so changes to other products leave the
+        exact matches as they were. Spelling corrections depend on the whole
+        vocabulary, so the ranking is only carried over when none were made:
+        every word of the ingredient is a known catalog word, and no changed
+        name or brand contains one (which could have made it known).
+        """
+        if revision == self.revision:
+            return True
+        if not self.history_start <= revision < self.revision:
+            return False
+        texts = [text for changed, texts in self.history if changed > revision for text in texts]
+        norm_ingredient = ingredient.strip().lower()
+        words = fuzzy_words(norm_ingredient)
+        if any(word in text for word in words for text in texts) or not all(map(self.terms.known, words)):
+            return False
+        if norm_ingredient == "food coloring":
+            variations = self.rules.coloring_phrases
+        else:
+            variations = self.variations(norm_ingredient)
+        return not any(variation in text for variation in variations for text in texts)
+
+    @property
+    def terms(self):
+        """Trigram index over name and brand words, built on first use."""
+        if self._terms is None:
+            with self._terms_lock:
+                if self._terms is None:
+                    self._terms = TrigramIndex(
+                        text for i, product in enumerate(self.products) if product is not None
+                        for text in (self.names[i], self.brands[i])
+                    )
+        return self._terms
+
+    def candidates(self, variation):
+        """Sorted indices of products whose name or brand may contain ``variation``."""
+        cached = self._candidate_cache.get(variation)
+        if cached is not None:
+            return cached
+        pieces = variation.split()
+        if not pieces:
+            result = [i for i, product in enumerate(self.products) if product is not None]
+        else:
+            # A whitespace-free piece of the variation can only occur inside a
+            # single indexed word, so scanning the vocabulary is enough.
+            piece = max(pieces, key=len)
+            hits = set()
+            for word, postings in self.index.items():
+                if piece in word:
+                    hits.update(postings)
+            result = sorted(hits)
+        self._candidate_cache[variation] = result
+        return result
+
+    def match_cost(self, ingredient):
+        """Rough cost of matching ``ingredient``: index postings its variations' words hit."""
+        norm_ingredient = ingredient.strip().lower()
+        variations = self.rules.synonyms.get(norm_ingredient, [norm_ingredient]) + [norm_ingredient]
+        return sum(len(self.index.get(word, ())) for variation in variations for word in variation.split())
+
+    def match(self, ingredient, limit=MAX_MATCHES):
+        return [self.products[i] for i in self.ranked_indices(ingredient, limit)]
+
+    def ranked_indices(self, ingredient, limit=MAX_MATCHES):
+        """``match_indices``, topped up from a spelling-corrected ingredient when short.
+
+        When exact matching fills ``limit`` the result is exactly
+        ``match_indices``. Otherwise words no catalog word starts with are
+        corrected ("tumeric" -> "turmeric", "red chili powder" -> "red chilli
+        powder") and the corrected ingredient's matches are appended after the
+        exact ones, skipping duplicates. Ingredients with nothing to correct
+        stay short.
+        """
+        found = self.match_indices(ingredient, limit)
+        if len(found) < limit:
+            corrected = self.terms.correct(ingredient.strip())
+            if corrected:
+                seen = set(found)
+                found += [i for i in self.match_indices(corrected, limit) if i not in seen][:limit - len(found)]
+        return found
+
+    def match_indices(self, ingredient, limit=MAX_MATCHES):
+        """Positions in ``self.products`` of the top ``limit`` matches, best first."""
+        norm_ingredient = ingredient.strip().lower()
+        variations = self.variations(norm_ingredient)
+
+        if norm_ingredient == "food coloring":
+            return self._match_coloring(limit)
+
+        candidates = set()
+        for variation in variations:
+            candidates.update(self.candidates(variation))
+
+        patterns = [compile_variation(variation) for variation in variations]
+        ingredient_tokens = set(simple_tokenize(norm_ingredient))
+        scored_matches = []
+
+        for i in sorted(candidates):
+            product_name = self.names[i]
+            brand_name = self.brands[i]
+            words = self.name_words[i]
+
+            if not any(variation in product_name for variation in variations):
+                if self.excluded[i] or len(words) > 6:
+                    continue
+
+            score = 0
+            for variation, pattern in zip(variations, patterns):
+                if variation == product_name or variation == brand_name:
+                    score = max(score, 100)
+                    break
+                if pattern.search(product_name):
+                    score = max(score, 85)
+                elif pattern.search(brand_name):
+                    score = max(score, 80)
+                if product_name.startswith(variation + ' ') or brand_name.startswith(variation + ' '):
+                    score = max(score, 75)
+                if variation in product_name:
+                    base_score = 70
+                    if len(words) > 4:
+                        base_score -= 10
+                    score = max(score, base_score)
+                elif variation in brand_name:
+                    score = max(score, 45)
+            if any(word.startswith(norm_ingredient) for word in words):
+                score = max(score, 60)
+
+            if score > 0:
+                if self.preferred_category[i]:
+                    score += 15
+                score += self._similarity(ingredient_tokens, self.name_tokens[i]) * 25
+                if self.preferred_keyword[i]:
+                    score += 20
+                if len(words) <= 3:
+                    score += 10
+                if score >= 50:
+                    scored_matches.append((i, score))
+
+        scored_matches.sort(key=lambda x: x[1], reverse=True)
+        return [i for i, _ in scored_matches[:limit]]
+
+    def _match_coloring(self, limit):
+        candidates = set()
+        for phrase in self.rules.coloring_phrases:
+            candidates.update(self.candidates(phrase))
+        matches = []
+        for i in sorted(candidates):
+            if self.rules.is_coloring(self.names[i]):
+                matches.append(i)
+                if len(matches) == limit:
+                    break
+        return matches
+
+    @staticmethod
+    def _similarity(tokens1, tokens2):
+        if not tokens1 or not tokens2:
+            return 0
+        union = tokens1 | tokens2
+        return len(tokens1 & tokens2) / len(union) if union else 0
+
+
+def build_matching_engine(products, version=None, backend=None, rules=None, revision=0):
+    """The vectorized engine when numpy is installed, else the pure-Python one.
+
+    ``MATCH_BACKEND=python`` (or ``backend="python"``) forces the reference engine.
+    """
+    backend = backend or os.getenv("MATCH_BACKEND", "auto")
+    if backend == "python":
+        return MatchingEngine(products, version=version, rules=rules, revision=revision)
+    # Imported here so numpy only loads once an engine is actually built
+    try:
+        from vector_matching import VectorMatchingEngine
+    except ImportError:
+        # vectorized scoring is optional; MatchingEngine always works
+        if backend == "numpy":
+            raise RuntimeError("MATCH_BACKEND=numpy requires numpy")
+        return MatchingEngine(products, version=version, rules=rules, revision=revision)
+    return VectorMatchingEngine(products, version=version, rules=rules, revision=revision)
@@ -0,0 +1,99 @@
+import multiprocessing
+import os
+from concurrent.futures import ProcessPoolExecutor
+from functools import partial
+
+from catalog import load_catalog
+from catalog_changes import read_changes
+from database import read_engine
+from matching import MAX_MATCHES, build_matching_engine, store_version
+from rules import MatchingRules
+
+# Set by _init_worker inside each pool process
+_worker_catalog = None
+_worker_engine = None
+
+
+class StaleCatalogError(RuntimeError):
+    """A worker's catalog or rules version differs from the one the caller matched against."""
+
+
+def _init_worker(source, rules_data, revision):
+    global _worker_catalog, _worker_engine
+    _worker_catalog = load_catalog(source, upto=revision)
+    # The caller's rules, not whatever the rules file holds by now
+    _worker_engine = build_matching_engine(
+        _worker_catalog.products, version=_worker_catalog.base_version,
+        rules=MatchingRules(rules_data), revision=_worker_catalog.revision,
+    )
+
+
+def _catch_up(revision):
+    # Replay the catalog writes logged since this worker's revision, up to the caller's
+    global _worker_catalog, _worker_engine
+    if revision > _worker_engine.revision:
+        catalog = _worker_catalog.apply(
+            read_changes(read_engine, _worker_catalog.generation, _worker_catalog.revision, revision), revision
+        )
+        changes = catalog.changes_since(_worker_catalog)
+        if changes is not None:
+            _worker_engine = _worker_engine.apply_changes(changes, catalog.revision)
+            _worker_catalog = catalog
+    if _worker_engine.revision != revision:
+        raise StaleCatalogError(f"worker is at catalog revision {_worker_engine.revision}, expected {revision}")
+
+
+def _match_in_worker(version, revision, limit, ingredient):
+    if _worker_engine.store_version != version:
+        raise StaleCatalogError(f"worker has {_worker_engine.store_version}, expected {version}")
+    if _worker_engine.revision != revision:
+        _catch_up(revision)
+    return [_worker_engine.products[i].id for i in _worker_engine.ranked_indices(ingredient, limit)]
+
+
+def _worker_ready():
+    return os.getpid()
+
+
+def default_workers():
+    # Inline by default: with the vectorized engine one ingredient takes a few
+    # milliseconds, less than a round trip to a worker process
+    return int(os.getenv("MATCH_WORKERS", "1"))
+
+
+class MatchingPool:
+    """Process pool whose workers each hold a preloaded MatchingEngine.
+
+    Workers return product ids rather than products, so only a few short
+    strings cross the process boundary; the caller resolves them against its
+    own engine for the same catalog and rules version. Catalog writes don't
+    restart the pool: a worker behind the caller's revision replays the
+    change log up to it first. Results come back in input order and are
+    identical to ``MatchingEngine.ranked_indices``.
+
+    Every worker loads the catalog and builds its engine as soon as the pool
+    is created; ``ready`` turns true once they have.
+    """
+
+    def __init__(self, snapshot, rules, workers=None):
+        self.version = store_version(snapshot.base_version, rules)
+        self.workers = workers or default_workers()
+        # spawn, not fork: the server process is multi-threaded
+        self._executor = ProcessPoolExecutor(
+            max_workers=self.workers,
+            mp_context=multiprocessing.get_context("spawn"),
+            initializer=_init_worker,
+            initargs=(str(snapshot.source), rules.data, snapshot.revision),
+        )
+        # One task per worker makes the executor spawn (and initialize) all of them now
+        self._warmup = [self._executor.submit(_worker_ready) for _ in range(self.workers)]
+
+    @property
+    def ready(self):
+        return all(future.done() for future in self._warmup)
+
+    def match_ids(self, ingredients, revision, limit=MAX_MATCHES):
+        return list(self._executor.map(partial(_match_in_worker, self.version, revision, limit), ingredients))
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
@@ -14,7 +14,7 @@ class Product(BaseModel):
     class Config:
         from_attributes = True
 
-from sqlalchemy import Column, String, Integer
+from sqlalchemy import Column, Float, String, Integer, Index
 from sqlalchemy.ext.declarative import declarative_base
 
 Base = declarative_base()
@@ -29,4 +29,21 @@ class ProductDB(Base):
     imageUrl = Column(String)
     category = Column(String)
     subCategory = Column(String)
-    absoluteUrl = Column(String)
\ No newline at end of file
+    absoluteUrl = Column(String)
+    # Numeric forms of price/discountPrice, derived at import time for SQL
+    # filtering and sorting: what the customer pays, and the saving off MRP
+    sale_price = Column(Float)
+    discount_amount = Column(Float)
+    discount_pct = Column(Float)
+
+    # Serves category listings in keyset (category, id) order, and price
+    # filters/sorts as index range scans with or without a category
+    __table_args__ = (
+        Index("ix_products_category_id", "category", "id"),
+        Index("ix_products_category_sale_price", "category", "sale_price", "id"),
+        Index("ix_products_category_discount_amount", "category", "discount_amount", "id"),
+        Index("ix_products_category_discount_pct", "category", "discount_pct", "id"),
+        Index("ix_products_sale_price", "sale_price", "id"),
+        Index("ix_products_discount_amount", "discount_amount", "id"),
+        Index("ix_products_discount_pct", "discount_pct", "id"),
+    )
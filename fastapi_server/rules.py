@@ -0,0 +1,177 @@
+"""Ingredient matching rules, loaded from a data file and compiled once.
+
+The keyword lists (exclude, preferred, preferred categories, food
+colouring phrases) and the ingredient synonyms live in
+``matching_rules.json`` (or the file ``MATCHING_RULES`` points to), so they
+can be tuned without a code change. All keyword lists compile into one
+Aho-Corasick automaton: a single pass over a product's text reports every
+list with a hit, however many rules there are. The synonyms stay a dict:
+they are looked up by the whole normalized ingredient, never searched for
+in product text, and the matching engine's word index already narrows each
+variation to the products that can contain it. ``get_rules`` picks up edits
+to the file on the next request, without a restart.
+"""
+import hashlib
+import json
+import logging
+import os
+import threading
+from pathlib import Path
+
+logger = logging.getLogger(__name__)
+
+RULES_PATH = Path(os.getenv("MATCHING_RULES", Path(__file__).parent / "matching_rules.json"))
+
+# Keyword list -> bit in the masks KeywordAutomaton.scan returns
+EXCLUDE = 1
+PREFERRED_KEYWORD = 2
+PREFERRED_CATEGORY = 4
+COLORING = 8
+COLORING_BAD = 16
+KEYWORD_LISTS = {
+    "exclude_keywords": EXCLUDE,
+    "preferred_keywords": PREFERRED_KEYWORD,
+    "preferred_categories": PREFERRED_CATEGORY,
+    "coloring_phrases": COLORING,
+    "coloring_bad_phrases": COLORING_BAD,
+}
+# Per-product results kept per rules version before the cache starts over
+MAX_CACHED_PRODUCTS = 200000
+
+
+class KeywordAutomaton:
+    """Aho-Corasick matcher reporting which keyword groups occur in a text.
+
+    Built as a DFA: every state has a transition for every character that
+    appears in a keyword, with failure links already folded in, so ``scan``
+    does one dict lookup per character and never backtracks.
+    """
+
+    def __init__(self, keywords):
+        # keywords: {keyword: group bitmask}
+        goto = [{}]
+        output = [0]
+        for keyword, mask in keywords.items():
+            state = 0
+            for char in keyword:
+                if char not in goto[state]:
+                    goto.append({})
+                    output.append(0)
+                    goto[state][char] = len(goto) - 1
+                state = goto[state][char]
+            output[state] |= mask
+
+        # Breadth-first, so a state's failure target is always finished first
+        fail = [0] * len(goto)
+        queue = list(goto[0].values())
+        delta = [dict(goto[0])] + [None] * (len(goto) - 1)
+        for state in queue:
+            output[state] |= output[fail[state]]
+            delta[state] = {**delta[fail[state]], **goto[state]}
+            for char, child in goto[state].items():
+                fail[child] = delta[fail[state]].get(char, 0) if state else 0
+                queue.append(child)
+        self.delta = delta
+        self.output = output
+
+    def scan(self, text):
+        delta = self.delta
+        output = self.output
+        state = 0
+        hits = 0
+        for char in text:
+            state = delta[state].get(char, 0)
+            hits |= output[state]
+        return hits
+
+
+class MatchingRules:
+    """One version of the rules; immutable once built."""
+
+    def __init__(self, data):
+        self.data = data
+        self.version = hashlib.sha1(json.dumps(data, sort_keys=True).encode()).hexdigest()[:12]
+        for name in KEYWORD_LISTS:
+            setattr(self, name, [keyword.strip().lower() for keyword in data[name]])
+        self.synonyms = {
+            ingredient.strip().lower(): [variation.strip().lower() for variation in variations]
+            for ingredient, variations in data["synonyms"].items()
+        }
+        keywords = {}
+        for name, mask in KEYWORD_LISTS.items():
+            for keyword in getattr(self, name):
+                if keyword:
+                    keywords[keyword] = keywords.get(keyword, 0) | mask
+        self.automaton = KeywordAutomaton(keywords)
+        self._product_flags = {}
+
+    @classmethod
+    def load(cls, path=RULES_PATH):
+        data = json.loads(Path(path).read_text(encoding="utf-8"))
+        missing = [name for name in (*KEYWORD_LISTS, "synonyms") if name not in data]
+        if missing:
+            raise ValueError(f"{path}: missing rule lists {', '.join(missing)}")
+        return cls(data)
+
+    def scan(self, text):
+        return self.automaton.scan(text)
+
+    def product_flags(self, name, brand, category, sub_category):
+        """(excluded, preferred_category, preferred_keyword) for normalized product fields, cached."""
+        key = (name, brand, category, sub_category)
+        flags = self._product_flags.get(key)
+        if flags is None:
+            text = self.scan(f"{name} {brand}")
+            # Category and subCategory are scanned apart so no hit spans the two
+            categories = self.scan(category) | self.scan(sub_category)
+            flags = (bool(text & EXCLUDE), bool(categories & PREFERRED_CATEGORY), bool(text & PREFERRED_KEYWORD))
+            if len(self._product_flags) >= MAX_CACHED_PRODUCTS:
+                self._product_flags.clear()
+            self._product_flags[key] = flags
+        return flags
+
+    def is_coloring(self, name):
+        hits = self.scan(name)
+        return bool(hits & COLORING) and not hits & COLORING_BAD
+
+
+_rules = None
+_signature = None
+_lock = threading.Lock()
+
+
+def get_rules():
+    """Current rules, reloaded when the rules file changes.
+
+    Change detection is a ``stat`` call. A file that fails to load or goes
+    missing is reported and the previous rules stay in force.
+    """
+    global _rules, _signature
+    try:
+        stat = RULES_PATH.stat()
+    except OSError as e:
+        if _rules is None:
+            raise
+        # Warn once per disappearance; the file is reloaded when it returns
+        with _lock:
+            if _signature is not None:
+                logger.warning("Matching rules file unavailable, keeping the previous version: %s", e)
+                _signature = None
+        return _rules
+    signature = (stat.st_mtime_ns, stat.st_size)
+    if signature == _signature:
+        return _rules
+    with _lock:
+        if signature != _signature:
+            try:
+                rules = MatchingRules.load(RULES_PATH)
+            except (OSError, ValueError, KeyError, TypeError, AttributeError) as e:
+                if _rules is None:
+                    raise
+                logger.warning("Matching rules not reloaded, keeping the previous version: %s", e)
+            else:
+                if _rules is None or rules.version != _rules.version:
+                    _rules = rules
+                    logger.info("Matching rules loaded: version %s", rules.version)
+            _signature = signature
+    return _rules
@@ -0,0 +1,282 @@
+"""Fast JSON encoding for product payloads and cached catalog responses.
+
+Product JSON is encoded once per distinct product content and spliced
+into list, search and chat responses as raw bytes, so hot endpoints skip pydantic
+validation and the stdlib encoder entirely. Responses derived only from
+the catalog carry an ETag built from the catalog version, answer
+If-None-Match with 304, and are kept (with a lazily gzipped copy) in a
+byte-bounded LRU.
+"""
+import gzip
+import hashlib
+import json
+import os
+import threading
+from collections import OrderedDict
+from operator import attrgetter
+
+from fastapi import Response
+
+from catalog import get_catalog_version, get_file_version
+from catalog_changes import changed_product_ids, import_generation, latest_revision
+from database import read_engine
+from models import Product
+
+try:
+    import orjson
+except ImportError:  # stdlib fallback: same documents, just slower
+    orjson = None
+
+PRODUCT_FIELDS = tuple(Product.model_fields)
+# A product's field values in PRODUCT_FIELDS order, from an ORM row or a catalog record
+product_values = attrgetter(*PRODUCT_FIELDS)
+GZIP_MIN_SIZE = 1024
+GZIP_LEVEL = 6
+RESPONSE_CACHE_BYTES = int(float(os.getenv("RESPONSE_CACHE_MB", "64")) * 1024 * 1024)
+
+
+def dumps(obj) -> bytes:
+    if orjson is not None:
+        return orjson.dumps(obj)
+    return json.dumps(obj, ensure_ascii=False, separators=(",", ":")).encode()
+
+
+def product_dict(product):
+    # Works for ORM rows and catalog records alike; keys in Product field order
+    return {field: getattr(product, field) for field in PRODUCT_FIELDS}
+
+
+class ProductPayloads:
+    """Serialized JSON per product, filled on demand and keyed by content.
+
+    The key is the product's field values, so a catalog record and a
+    database row only share bytes when they hold the same product, and a
+    product changed by a catalog write or an import is encoded afresh
+    rather than served stale. Only the latest content per product id is kept.
+
+    Each product remembers the catalog revision that last changed it. A
+    reader that started at an older revision may still hold the product's
+    previous content; it is encoded for that reader but not cached, so it
+    can't displace the current entry.
+    """
+
+    def __init__(self, version, revision=0):
+        self.version = version
+        self.revision = revision
+        self._bytes = {}
+        self._keys = {}
+        self._changed = {}
+
+    def reader(self):
+        """A view for one request, bound to the revision its reads start from."""
+        return PayloadReader(self, self.revision)
+
+    def get(self, product, revision=None) -> bytes:
+        return self.get_values(product_values(product), revision)
+
+    def get_values(self, values, revision=None) -> bytes:
+        data = self._bytes.get(values)
+        if data is None:
+            data = dumps(dict(zip(PRODUCT_FIELDS, values)))
+            product_id = values[0]
+            if revision is None or self._changed.get(product_id, -1) <= revision:
+                previous = self._keys.get(product_id)
+                if previous is not None:
+                    self._bytes.pop(previous, None)
+                self._keys[product_id] = values
+                self._bytes[values] = data
+        return data
+
+    def encode_list(self, products, revision=None) -> bytes:
+        return b"[" + b",".join([self.get(product, revision) for product in products]) + b"]"
+
+    def encode_rows(self, rows, revision=None) -> bytes:
+        # Tuples of field values in PRODUCT_FIELDS order, as storage selects them
+        return b"[" + b",".join([self.get_values(values, revision) for values in rows]) + b"]"
+
+    def forget(self, product_ids, revision):
+        for product_id in product_ids:
+            key = self._keys.pop(product_id, None)
+            if key is not None:
+                self._bytes.pop(key, None)
+            self._changed[product_id] = revision
+        self.revision = revision
+
+
+class PayloadReader:
+    __slots__ = ("payloads", "revision")
+
+    def __init__(self, payloads, revision):
+        self.payloads = payloads
+        self.revision = revision
+
+    def get(self, product) -> bytes:
+        return self.payloads.get(product, self.revision)
+
+    def encode_list(self, products) -> bytes:
+        return self.payloads.encode_list(products, self.revision)
+
+    def encode_rows(self, rows) -> bytes:
+        return self.payloads.encode_rows(rows, self.revision)
+
+
+_payloads = None
+_payloads_lock = threading.Lock()
+
+
+def get_product_payloads():
+    """Payloads for one request; call it before reading the products to encode.
+
+    Started afresh for each import, which may have replaced any number of rows.
+    """
+    global _payloads
+    version = import_generation() or get_file_version()
+    revision = latest_revision()
+    if _payloads is None or _payloads.version != version or _payloads.revision < revision:
+        with _payloads_lock:
+            if _payloads is None or _payloads.version != version:
+                _payloads = ProductPayloads(version, revision)
+            elif _payloads.revision < revision:
+                _payloads.forget(changed_product_ids(read_engine, _payloads.revision, revision), revision)
+    return _payloads.reader()
+
+
+def encode_ingredient_match(payloads, ingredient, products) -> bytes:
+    return b'{"ingredient":' + dumps(ingredient) + b',"matches":' + payloads.encode_list(products) + b"}"
+
+
+def encode_ingredient_matches(payloads, ingredient_matches) -> bytes:
+    """Encode ``[(ingredient, products), ...]`` as a list of IngredientMatch objects."""
+    return b"[" + b",".join([
+        encode_ingredient_match(payloads, ingredient, products) for ingredient, products in ingredient_matches
+    ]) + b"]"
+
+
+def sse_event(event, data: bytes) -> bytes:
+    # Encoded JSON never contains a raw newline, so it fits on one data: line
+    return b"event: " + event.encode() + b"\ndata: " + data + b"\n\n"
+
+
+def json_response(body: bytes, headers=None, status_code=200) -> Response:
+    return Response(body, status_code=status_code, media_type="application/json", headers=headers)
+
+
+class CachedResponse:
+    __slots__ = ("etag", "body", "headers", "_gzipped")
+
+    def __init__(self, etag, body, headers):
+        self.etag = etag
+        self.body = body
+        self.headers = headers
+        self._gzipped = None
+
+    def gzipped(self):
+        if self._gzipped is None:
+            self._gzipped = gzip.compress(self.body, GZIP_LEVEL, mtime=0)
+        return self._gzipped
+
+    @property
+    def size(self):
+        return len(self.body) + len(self._gzipped or b"")
+
+
+class ResponseCache:
+    """LRU of encoded catalog responses keyed by ETag, bounded by total bytes."""
+
+    def __init__(self, max_bytes=RESPONSE_CACHE_BYTES):
+        self.max_bytes = max_bytes
+        self._entries = OrderedDict()
+        self._bytes = 0
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        self.not_modified = 0
+
+    def get(self, etag):
+        with self._lock:
+            entry = self._entries.get(etag)
+            if entry is None:
+                self.misses += 1
+                return None
+            self._entries.move_to_end(etag)
+            self.hits += 1
+            return entry
+
+    def put(self, entry):
+        with self._lock:
+            if entry.size > self.max_bytes:
+                return
+            previous = self._entries.pop(entry.etag, None)
+            if previous is not None:
+                self._bytes -= previous.size
+            self._entries[entry.etag] = entry
+            self._bytes += entry.size
+            self._evict()
+
+    def grew(self, entry, before):
+        # A cached entry gained its gzipped copy
+        with self._lock:
+            if self._entries.get(entry.etag) is entry:
+                self._bytes += entry.size - before
+                self._evict()
+
+    def _evict(self):
+        while self._bytes > self.max_bytes and self._entries:
+            _, evicted = self._entries.popitem(last=False)
+            self._bytes -= evicted.size
+
+    def stats(self):
+        lookups = self.hits + self.misses
+        return {
+            "entries": len(self._entries),
+            "bytes": self._bytes,
+            "hits": self.hits,
+            "misses": self.misses,
+            "not_modified": self.not_modified,
+            "hit_ratio": self.hits / lookups if lookups else 0.0,
+        }
+
+
+response_cache = ResponseCache()
+
+
+def catalog_etag(request) -> str:
+    # Catalog responses only change with the catalog, so its version plus the
+    # request URL is a complete validator
+    url = f"{request.url.path}?{request.url.query}"
+    return f'W/"{get_catalog_version()}-{hashlib.sha1(url.encode()).hexdigest()[:12]}"'
+
+
+def etag_matches(if_none_match, etag) -> bool:
+    if not if_none_match:
+        return False
+    if if_none_match.strip() == "*":
+        return True
+    # Weak comparison: ignore W/ prefixes on either side
+    candidates = {tag.strip().removeprefix("W/") for tag in if_none_match.split(",")}
+    return etag.removeprefix("W/") in candidates
+
+
+def catalog_response(request, build) -> Response:
+    """Serve a catalog-derived response with ETag, caching and gzip.
+
+    ``build()`` returns ``(body, headers)`` and only runs on a cache miss.
+    """
+    etag = catalog_etag(request)
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        response_cache.not_modified += 1
+        return Response(status_code=304, headers={"ETag": etag})
+    entry = response_cache.get(etag)
+    if entry is None:
+        body, headers = build()
+        entry = CachedResponse(etag, body, dict(headers or {}))
+        response_cache.put(entry)
+    headers = {**entry.headers, "ETag": etag, "Vary": "Accept-Encoding"}
+    if len(entry.body) >= GZIP_MIN_SIZE and "gzip" in request.headers.get("accept-encoding", ""):
+        before = entry.size
+        body = entry.gzipped()
+        if entry.size != before:
+            response_cache.grew(entry, before)
+        # GZipMiddleware leaves responses that already carry Content-Encoding alone
+        return json_response(body, {**headers, "Content-Encoding": "gzip"})
+    return json_response(entry.body, headers)
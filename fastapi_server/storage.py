@@ -1,76 +1,376 @@
-import csv
-from sqlalchemy import create_engine, text
+import logging
+import re
+import threading
+from itertools import groupby
+from sqlalchemy import select, text, tuple_
+from sqlalchemy.exc import OperationalError
 from sqlalchemy.orm import sessionmaker
-from models import ProductDB, Base
-from typing import List
+from models import Product, ProductDB, Base
+from catalog import find_catalog_csv, get_file_version
+from catalog_changes import append_changes, create_changes_table, latest_revision, note_revision
+from importer import (
+    FIELDS, batched, ensure_price_columns, import_catalog, iter_csv_rows, price_fields, upsert_statement,
+)
+from database import read_engine, write_engine
+from metrics import span, timed
+from fuzzy import get_term_index
+from typing import List, Optional
 
-DATABASE_URL = "sqlite:///./products.db"
+logger = logging.getLogger(__name__)
 
-engine = create_engine(DATABASE_URL, connect_args={"check_same_thread": False})
-SessionLocal = sessionmaker(bind=engine)
-Base.metadata.create_all(bind=engine)
+# Product fields in Product (response) order, selected as plain rows
+PRODUCT_COLUMNS = [ProductDB.__table__.c[name] for name in Product.model_fields]
+
+# Reads share a pool of connections; anything that writes goes through the
+# single serialized write connection (see database.py)
+SessionLocal = sessionmaker(bind=read_engine)
+WriteSession = sessionmaker(bind=write_engine)
+
+def create_schema():
+    Base.metadata.create_all(bind=write_engine)
+    # create_all skips new columns and indexes on tables that already exist
+    ensure_price_columns(write_engine)
+    for index in ProductDB.__table__.indexes:
+        index.create(bind=write_engine, checkfirst=True)
+    with write_engine.begin() as conn:
+        create_changes_table(conn)
+
+# Column weights for bm25(): name hits outrank brand, then category, subCategory
+FTS_WEIGHTS = "10.0, 5.0, 2.0, 1.0"
+
+# Searches without a limit still try spelling corrections below this many hits
+FUZZY_MIN_RESULTS = 10
+
+def build_fts_query(query: str, corrections=None) -> str:
+    # Quote every word so user input can't inject FTS syntax; "*" makes it a prefix match
+    corrections = corrections or {}
+    terms = []
+    for token in re.findall(r"\w+", query.lower()):
+        alternatives = [f'"{token}"*'] + [f'"{term}"' for term in corrections.get(token, ())]
+        terms.append(alternatives[0] if len(alternatives) == 1 else "(" + " OR ".join(alternatives) + ")")
+    # FTS5 wants an explicit AND next to a parenthesized group
+    return " AND ".join(terms)
+
+# sort key -> (column, descending): cheapest first, biggest discounts first
+SORT_COLUMNS = {
+    "price": (ProductDB.sale_price, False),
+    "discount": (ProductDB.discount_amount, True),
+    "discount_pct": (ProductDB.discount_pct, True),
+}
+
+def filter_products(statement, category=None, min_price=None, max_price=None, sort=None):
+    if category is not None:
+        statement = statement.where(ProductDB.category == category)
+    if min_price is not None:
+        statement = statement.where(ProductDB.sale_price >= min_price)
+    if max_price is not None:
+        statement = statement.where(ProductDB.sale_price <= max_price)
+    if sort is not None:
+        # Products whose price could not be parsed have nothing to sort on
+        statement = statement.where(SORT_COLUMNS[sort][0].is_not(None))
+    return statement
+
+def order_products(statement, sort=None):
+    # By (sort value, id), or id alone; the order keyset cursors resume in
+    if sort is None:
+        return statement.order_by(ProductDB.id)
+    column, descending = SORT_COLUMNS[sort]
+    return statement.order_by(*((column.desc(), ProductDB.id.desc()) if descending else (column, ProductDB.id)))
+
+def sort_cursor(product, sort: Optional[str]) -> str:
+    # Sorted pages resume after (sort value, id); unsorted ones after id alone
+    if sort is None:
+        return product.id
+    return f"{getattr(product, SORT_COLUMNS[sort][0].key)!r}:{product.id}"
+
+def parse_sort_cursor(after: str):
+    value, separator, product_id = after.partition(":")
+    try:
+        if not separator:
+            raise ValueError
+        return float(value), product_id
+    except ValueError:
+        raise ValueError(f"Invalid cursor for a sorted listing: {after!r}")
+
+CART_STATEMENTS = {
+    # Single-statement upsert; relies on the unique index on cart.product_id
+    "add": text("""
+        INSERT INTO cart (product_id, quantity) VALUES (:product_id, :quantity)
+        ON CONFLICT(product_id) DO UPDATE SET quantity = quantity + excluded.quantity
+    """),
+    "update": text("UPDATE cart SET quantity = :quantity WHERE product_id = :product_id"),
+    "remove": text("DELETE FROM cart WHERE product_id = :product_id"),
+}
+# A single add also reads back the item's new quantity
+CART_ADD_RETURNING = text(CART_STATEMENTS["add"].text + " RETURNING quantity")
 
 class DBStorage:
     def __init__(self):
+        self.fts_enabled = False
+        create_schema()
         self.load_csv_data()
+        self.create_search_index()
         self.create_cart_table()
 
+    @timed("storage.load_csv_data")
     def load_csv_data(self):
-        session = SessionLocal()
+        # Incremental: only new or changed rows are written, and nothing at all
+        # when this catalog version was already imported
         try:
-            # Only load if table is empty
-            if session.query(ProductDB).first():
-                return
-            with open('../attached_assets/bigbasket_products.csv', newline='', encoding='utf-8') as csvfile:
-                reader = csv.DictReader(csvfile)
-                products = [
-                    ProductDB(
-                        id=row['ProductID'],
-                        productName=row['ProductName'],
-                        brand=row['Brand'],
-                        price=row['Price'],
-                        discountPrice=row['DiscountPrice'],
-                        imageUrl=row['Image_Url'],
-                        category=row['Category'],
-                        subCategory=row['SubCategory'],
-                        absoluteUrl=row['Absolute_Url'],
-                    )
-                    for row in reader
-                ]
-                session.bulk_save_objects(products)
-                session.commit()
+            # The version is a hash of the file and the rows are only read when it
+            # differs from the imported one, so a warm start never parses the CSV.
+            # The file as is: the import starts a new generation, without earlier API writes
+            path = find_catalog_csv()
+            stats = import_catalog(write_engine, iter_csv_rows(path), path, get_file_version())
+            if stats is not None:
+                logger.info("Catalog import: %s", stats)
         except Exception as e:
-            print("Error loading CSV:", e)
-        finally:
-            session.close()
+            logger.warning("Error loading CSV: %s", e)
+
+    @timed("storage.get_all_products")
+    def get_all_products(self) -> List[tuple]:
+        # Row tuples in PRODUCT_COLUMNS order, not ORM objects: full listings go
+        # straight to encoded bytes, and building 30k instances would dominate
+        with read_engine.connect() as conn:
+            return [tuple(row) for row in conn.execute(select(*PRODUCT_COLUMNS))]
 
-    def get_all_products(self) -> List[ProductDB]:
+    @timed("storage.get_products_page")
+    def get_products_page(
+        self, limit: int, after: Optional[str] = None, category: Optional[str] = None,
+        min_price: Optional[float] = None, max_price: Optional[float] = None, sort: Optional[str] = None,
+    ) -> List[ProductDB]:
+        # Keyset pagination: seek past the last (sort value,) id instead of
+        # OFFSET-scanning; each sort has a (category, value, id) index
+        statement = filter_products(select(ProductDB), category, min_price, max_price, sort)
+        if after is not None and sort is None:
+            statement = statement.where(ProductDB.id > after)
+        elif after is not None:
+            column, descending = SORT_COLUMNS[sort]
+            key = tuple_(column, ProductDB.id)
+            cursor = tuple_(*parse_sort_cursor(after))
+            statement = statement.where(key < cursor if descending else key > cursor)
+        statement = order_products(statement, sort)
         with SessionLocal() as session:
-            return session.query(ProductDB).all()
+            return list(session.scalars(statement.limit(limit)))
 
-    def search_products(self, query: str) -> List[ProductDB]:
+    def iter_products(
+        self, category: Optional[str] = None, batch_size: int = 500,
+        min_price: Optional[float] = None, max_price: Optional[float] = None, sort: Optional[str] = None,
+    ):
+        # Yields plain dicts straight off the cursor, batch_size rows at a time,
+        # in the same order as the paged listing
+        statement = filter_products(select(*PRODUCT_COLUMNS), category, min_price, max_price, sort)
+        statement = order_products(statement, sort)
         with SessionLocal() as session:
-            like_query = f"%{query.lower()}%"
-            return session.query(ProductDB).filter(
-                ProductDB.productName.ilike(like_query) |
-                ProductDB.brand.ilike(like_query) |
-                ProductDB.category.ilike(like_query)
-            ).all()
+            result = session.execute(statement.execution_options(yield_per=batch_size))
+            for row in result.mappings():
+                yield dict(row)
 
-    def get_products_by_category(self, category: str) -> List[ProductDB]:
+    @timed("storage.create_search_index")
+    def create_search_index(self):
+        with WriteSession() as session:
+            try:
+                exists = session.execute(text(
+                    "SELECT 1 FROM sqlite_master WHERE type = 'table' AND name = 'products_fts'"
+                )).fetchone()
+                session.execute(text("""
+                    CREATE VIRTUAL TABLE IF NOT EXISTS products_fts USING fts5(
+                        productName, brand, category, subCategory,
+                        content='products',
+                        tokenize='unicode61 remove_diacritics 2',
+                        prefix='2 3'
+                    )
+                """))
+            except OperationalError as e:
+                logger.warning("FTS5 unavailable, search falls back to LIKE: %s", e)
+                return
+            # Keep the external-content index in sync with every write to products
+            session.execute(text("""
+                CREATE TRIGGER IF NOT EXISTS products_fts_ai AFTER INSERT ON products BEGIN
+                    INSERT INTO products_fts(rowid, productName, brand, category, subCategory)
+                    VALUES (new.rowid, new.productName, new.brand, new.category, new.subCategory);
+                END
+            """))
+            session.execute(text("""
+                CREATE TRIGGER IF NOT EXISTS products_fts_ad AFTER DELETE ON products BEGIN
+                    INSERT INTO products_fts(products_fts, rowid, productName, brand, category, subCategory)
+                    VALUES ('delete', old.rowid, old.productName, old.brand, old.category, old.subCategory);
+                END
+            """))
+            session.execute(text("""
+                CREATE TRIGGER IF NOT EXISTS products_fts_au AFTER UPDATE ON products BEGIN
+                    INSERT INTO products_fts(products_fts, rowid, productName, brand, category, subCategory)
+                    VALUES ('delete', old.rowid, old.productName, old.brand, old.category, old.subCategory);
+                    INSERT INTO products_fts(rowid, productName, brand, category, subCategory)
+                    VALUES (new.rowid, new.productName, new.brand, new.category, new.subCategory);
+                END
+            """))
+            if not exists:
+                # Index rows that were loaded before the table and triggers existed
+                session.execute(text("INSERT INTO products_fts(products_fts) VALUES ('rebuild')"))
+            session.commit()
+        self.fts_enabled = True
+
+    @timed("storage.search_products")
+    def search_products(
+        self, query: str, limit: Optional[int] = None, mode: str = "fts",
+        min_price: Optional[float] = None, max_price: Optional[float] = None, sort: Optional[str] = None,
+    ) -> List[ProductDB]:
+        results = self.search_products_exact(query, limit, mode, min_price, max_price, sort)
+        if len(results) < (limit or FUZZY_MIN_RESULTS):
+            # Too few hits: retry with misspelled words swapped for catalog words
+            # ("tumeric" -> "turmeric") and append whatever is new
+            results += self.search_products_fuzzy(query, results, limit, mode, min_price, max_price, sort)
+        return results
+
+    def search_products_exact(self, query, limit, mode, min_price, max_price, sort) -> List[ProductDB]:
+        match = build_fts_query(query)
+        if mode == "fts" and self.fts_enabled and match:
+            return self.search_products_fts(match, limit, min_price, max_price, sort)
+        like_query = f"%{query.lower()}%"
+        statement = filter_products(select(ProductDB), None, min_price, max_price, sort).where(
+            ProductDB.productName.ilike(like_query) |
+            ProductDB.brand.ilike(like_query) |
+            ProductDB.category.ilike(like_query)
+        )
+        if sort is not None:
+            column, descending = SORT_COLUMNS[sort]
+            statement = statement.order_by(column.desc() if descending else column, ProductDB.id)
+        if limit:
+            statement = statement.limit(limit)
         with SessionLocal() as session:
-            return session.query(ProductDB).filter(ProductDB.category == category).all()
+            return list(session.scalars(statement))
 
-    def create_product(self, product_data) -> ProductDB:
+    @timed("storage.search_products_fuzzy")
+    def search_products_fuzzy(self, query, found, limit, mode, min_price, max_price, sort) -> List[ProductDB]:
+        terms = get_term_index()
+        if mode == "fts" and self.fts_enabled:
+            corrections = terms.corrections(query)
+            matches = corrections and self.search_products_fts(
+                build_fts_query(query, corrections), limit, min_price, max_price, sort
+            )
+        else:
+            corrected = terms.correct(query)
+            matches = corrected and self.search_products_exact(corrected, limit, mode, min_price, max_price, sort)
+        seen = {product.id for product in found}
+        extra = [product for product in matches or () if product.id not in seen]
+        return extra[:limit - len(found)] if limit else extra
+
+    @timed("storage.search_products_fts")
+    def search_products_fts(
+        self, match: str, limit: Optional[int] = None,
+        min_price: Optional[float] = None, max_price: Optional[float] = None, sort: Optional[str] = None,
+    ) -> List[ProductDB]:
+        conditions = ""
+        if min_price is not None:
+            conditions += " AND products.sale_price >= :min_price"
+        if max_price is not None:
+            conditions += " AND products.sale_price <= :max_price"
+        # Sorting replaces relevance order; rank still breaks ties
+        order = f"bm25(products_fts, {FTS_WEIGHTS}), products.rowid"
+        if sort is not None:
+            column, descending = SORT_COLUMNS[sort]
+            conditions += f" AND products.{column.key} IS NOT NULL"
+            order = f"products.{column.key}{' DESC' if descending else ''}, {order}"
         with SessionLocal() as session:
-            product = ProductDB(**product_data)
-            session.add(product)
+            statement = text(f"""
+                SELECT products.* FROM products_fts
+                JOIN products ON products.rowid = products_fts.rowid
+                WHERE products_fts MATCH :match{conditions}
+                ORDER BY {order}
+                LIMIT :limit
+            """)
+            return session.query(ProductDB).from_statement(statement).params(
+                match=match, limit=limit or -1, min_price=min_price, max_price=max_price
+            ).all()
+
+    @timed("storage.get_products_by_category")
+    def get_products_by_category(self, category: str) -> List[tuple]:
+        # Row tuples, like get_all_products
+        with read_engine.connect() as conn:
+            statement = select(*PRODUCT_COLUMNS).where(ProductDB.category == category)
+            return [tuple(row) for row in conn.execute(statement)]
+
+    # Catalog writes: each one updates the products table (and through its
+    # triggers the FTS index) and appends to the change log in one
+    # transaction, so every process can bring its in-memory catalog state
+    # up to the new revision incrementally
+
+    def existing_product_ids(self, session, product_ids):
+        return set(session.scalars(select(ProductDB.id).where(ProductDB.id.in_(list(product_ids)))))
+
+    def write_product_changes(self, session, changes) -> int:
+        """Write ``[(product_id, fields or None to delete), ...]`` in ``session``'s transaction.
+
+        Returns the new catalog revision.
+        """
+        final = {}
+        for product_id, data in changes:
+            final[product_id] = data
+        upserts = [{**data, **price_fields(data)} for data in final.values() if data is not None]
+        if upserts:
+            session.execute(upsert_statement(), upserts)
+        deletes = [product_id for product_id, data in final.items() if data is None]
+        for batch in batched(deletes, 500):
+            session.execute(ProductDB.__table__.delete().where(ProductDB.id.in_(batch)))
+        return append_changes(session.connection(), changes)
+
+    @timed("storage.create_product")
+    def create_product(self, product_data) -> Optional[ProductDB]:
+        # None when a product with this id already exists
+        data = {field: product_data[field] for field in FIELDS}
+        with WriteSession() as session:
+            if self.existing_product_ids(session, [data["id"]]):
+                return None
+            revision = self.write_product_changes(session, [(data["id"], data)])
             session.commit()
-            session.refresh(product)
-            return product
-        
+        note_revision(revision)
+        return ProductDB(**data, **price_fields(data))
+
+    @timed("storage.update_product")
+    def update_product(self, product_id: str, product_data) -> Optional[ProductDB]:
+        # None when there is no such product
+        data = {**{field: product_data[field] for field in FIELDS}, "id": product_id}
+        with WriteSession() as session:
+            if not self.existing_product_ids(session, [product_id]):
+                return None
+            revision = self.write_product_changes(session, [(product_id, data)])
+            session.commit()
+        note_revision(revision)
+        return ProductDB(**data, **price_fields(data))
+
+    @timed("storage.delete_product")
+    def delete_product(self, product_id: str) -> bool:
+        with WriteSession() as session:
+            if not self.existing_product_ids(session, [product_id]):
+                return False
+            revision = self.write_product_changes(session, [(product_id, None)])
+            session.commit()
+        note_revision(revision)
+        return True
+
+    @timed("storage.apply_product_changes")
+    def apply_product_changes(self, upserts, deletes) -> dict:
+        """Create or replace ``upserts``, then delete the ``deletes`` ids, in one transaction.
+
+        Ids that are not in the catalog are skipped when deleting.
+        """
+        changes = [(data["id"], {field: data[field] for field in FIELDS}) for data in upserts]
+        with WriteSession() as session:
+            if deletes:
+                existing = self.existing_product_ids(session, deletes) | {product_id for product_id, _ in changes}
+                deletes = [product_id for product_id in dict.fromkeys(deletes) if product_id in existing]
+            changes += [(product_id, None) for product_id in deletes]
+            revision = self.write_product_changes(session, changes) if changes else None
+            session.commit()
+        if revision is None:
+            revision = latest_revision()
+        else:
+            note_revision(revision)
+        return {"upserted": len(upserts), "deleted": len(deletes), "revision": revision}
+
     def create_cart_table(self):
-        with SessionLocal() as session:
+        with WriteSession() as session:
             session.execute(text("""
                 CREATE TABLE IF NOT EXISTS cart (
                     id INTEGER PRIMARY KEY AUTOINCREMENT,
@@ -79,31 +379,35 @@ class DBStorage:
                     FOREIGN KEY(product_id) REFERENCES products(id)
                 )
             """))
+            # Older databases may hold duplicate rows from racing adds: fold them
+            # into the oldest row so the unique index can be built
+            session.execute(text("""
+                UPDATE cart SET quantity = (
+                    SELECT SUM(quantity) FROM cart AS dup WHERE dup.product_id = cart.product_id
+                )
+                WHERE id IN (SELECT MIN(id) FROM cart GROUP BY product_id HAVING COUNT(*) > 1)
+            """))
+            session.execute(text("""
+                DELETE FROM cart WHERE id NOT IN (SELECT MIN(id) FROM cart GROUP BY product_id)
+            """))
+            session.execute(text(
+                "CREATE UNIQUE INDEX IF NOT EXISTS ux_cart_product_id ON cart(product_id)"
+            ))
             session.commit()
     
     from sqlalchemy import text
 
-    def add_to_cart(self, product_id: str, quantity: int):
-        with SessionLocal() as session:
-            # Check if item already in cart
-            result = session.execute(
-                text("SELECT quantity FROM cart WHERE product_id = :product_id"),
-                {"product_id": product_id}
-            ).fetchone()
-            if result:
-                # Update quantity
-                session.execute(
-                    text("UPDATE cart SET quantity = quantity + :quantity WHERE product_id = :product_id"),
-                    {"product_id": product_id, "quantity": quantity}
-                )
-            else:
-                # Insert new item
-                session.execute(
-                    text("INSERT INTO cart (product_id, quantity) VALUES (:product_id, :quantity)"),
-                    {"product_id": product_id, "quantity": quantity}
-                )
+    @timed("storage.add_to_cart")
+    def add_to_cart(self, product_id: str, quantity: int) -> int:
+        # Returns the quantity now in the cart
+        with WriteSession() as session:
+            quantity = session.execute(
+                CART_ADD_RETURNING, {"product_id": product_id, "quantity": quantity}
+            ).scalar_one()
             session.commit()
+        return quantity
     
+    @timed("storage.get_cart_items")
     def get_cart_items(self):
         with SessionLocal() as session:
             result = session.execute(text("""
@@ -126,20 +430,39 @@ class DBStorage:
                 for row in result.fetchall()
             ]
         
+    @timed("storage.update_cart_item")
     def update_cart_item(self, product_id: str, quantity: int):
-        with SessionLocal() as session:
-            session.execute(
-                text("UPDATE cart SET quantity = :quantity WHERE product_id = :product_id"),
-                {"product_id": product_id, "quantity": quantity}
-            )
+        with WriteSession() as session:
+            session.execute(CART_STATEMENTS["update"], {"product_id": product_id, "quantity": quantity})
             session.commit()
 
+    @timed("storage.remove_from_cart")
     def remove_from_cart(self, product_id: str):
-        with SessionLocal() as session:
-            session.execute(
-                text("DELETE FROM cart WHERE product_id = :product_id"),
-                {"product_id": product_id}
-            )
+        with WriteSession() as session:
+            session.execute(CART_STATEMENTS["remove"], {"product_id": product_id})
             session.commit()
 
-storage = DBStorage()
\ No newline at end of file
+    @timed("storage.apply_cart_operations")
+    def apply_cart_operations(self, operations):
+        # All operations share one transaction; consecutive runs of the same
+        # op go to the driver as a single executemany
+        with WriteSession() as session:
+            for op, group in groupby(operations, key=lambda operation: operation["op"]):
+                session.execute(CART_STATEMENTS[op], [
+                    {"product_id": operation["product_id"], "quantity": operation.get("quantity", 0)}
+                    for operation in group
+                ])
+            session.commit()
+
+_storage = None
+_storage_lock = threading.Lock()
+
+def get_storage() -> DBStorage:
+    """The process-wide storage, created (schema, catalog import, FTS index) on first use."""
+    global _storage
+    if _storage is None:
+        with _storage_lock:
+            if _storage is None:
+                with span("startup.storage_init"):
+                    _storage = DBStorage()
+    return _storage
@@ -0,0 +1,28 @@
+"""Every test runs against one generated catalog and a scratch database.
+
+The environment is set here, before any app module is imported: catalog,
+storage and chat read CATALOG_CSV / PRODUCTS_DB at import time.
+"""
+import os
+import sys
+from pathlib import Path
+
+import pytest
+
+sys.path.insert(0, str(Path(__file__).resolve().parent.parent))
+
+from benchmarks.common import prepare_environment  # noqa: E402
+
+# Database writes made outside the app (the importer CLI) are seen on the next request
+os.environ["CATALOG_POLL_SECONDS"] = "0"
+WORKDIR = prepare_environment(2000, seed=3)
+
+
+@pytest.fixture(scope="session")
+def client():
+    from fastapi.testclient import TestClient
+
+    from main import app
+
+    with TestClient(app) as client:
+        yield client
@@ -0,0 +1,36 @@
+import pytest
+
+from catalog import get_catalog
+
+
+def test_add_returns_only_the_upserted_item(client):
+    product_id = get_catalog().products[0].id
+    client.delete(f"/api/cart/{product_id}")
+    assert client.post("/api/cart", json={"product_id": product_id, "quantity": 2}).json() == {
+        "product_id": product_id, "quantity": 2,
+    }
+    assert client.post("/api/cart", json={"product_id": product_id, "quantity": 3}).json()["quantity"] == 5
+    cart = {item["product"]["_id"]: item["quantity"] for item in client.get("/api/cart").json()}
+    assert cart[product_id] == 5
+
+
+@pytest.mark.parametrize("operation", [
+    {"op": "update"}, {"op": "add"}, {"op": "update", "quantity": 0}, {"op": "add", "quantity": -2},
+])
+def test_batch_rejects_missing_or_invalid_quantity(client, operation):
+    product_id = get_catalog().products[1].id
+    client.delete(f"/api/cart/{product_id}")
+    client.post("/api/cart", json={"product_id": product_id, "quantity": 4})
+    batch = [{"op": "add", "product_id": product_id, "quantity": 1}, {**operation, "product_id": product_id}]
+    assert client.post("/api/cart/batch", json={"operations": batch}).status_code == 422
+    # Nothing in the batch was applied
+    cart = {item["product"]["_id"]: item["quantity"] for item in client.get("/api/cart").json()}
+    assert cart[product_id] == 4
+
+
+def test_batch_remove_needs_no_quantity(client):
+    product_id = get_catalog().products[1].id
+    client.post("/api/cart", json={"product_id": product_id, "quantity": 1})
+    batch = [{"op": "remove", "product_id": product_id}]
+    cart = client.post("/api/cart/batch", json={"operations": batch}).json()
+    assert product_id not in {item["product"]["_id"] for item in cart}
@@ -0,0 +1,131 @@
+import time
+
+import pytest
+
+import chat
+from catalog import get_catalog, load_catalog
+from matching import build_matching_engine
+from matching_pool import MatchingPool
+from rules import get_rules
+from serialization import ProductPayloads, dumps, product_dict, product_values
+
+INGREDIENTS = [
+    "onion", "salt", "rice", "tomato", "milk", "turmeric", "tumeric", "paneer", "red chili powder",
+    "basmati rice", "oil", "food coloring",
+]
+TOKEN = "test-token"
+
+
+def rebuilt_rankings():
+    # What a server started now would answer: the catalog file plus the whole change log
+    catalog = load_catalog(get_catalog().source)
+    engine = build_matching_engine(
+        catalog.products, version=catalog.base_version, rules=get_rules(), revision=catalog.revision
+    )
+    return {ingredient: [engine.products[i].id for i in engine.ranked_indices(ingredient)] for ingredient in INGREDIENTS}
+
+
+def served_rankings():
+    ranked = chat.rank_products(INGREDIENTS)
+    return {ingredient: [product.id for product in ranked[ingredient]] for ingredient in INGREDIENTS}
+
+
+def top(ingredient):
+    return chat.rank_products([ingredient])[ingredient][0].to_dict()
+
+
+@pytest.mark.parametrize("workers", [1, 2])
+def test_incremental_writes_match_rebuild(client, monkeypatch, workers):
+    monkeypatch.setenv("CATALOG_ADMIN_TOKEN", TOKEN)
+    monkeypatch.setenv("MATCH_WORKERS", str(workers))
+    monkeypatch.setattr(chat, "_pool", None)
+    pooled = []
+    match_ids = MatchingPool.match_ids
+    monkeypatch.setattr(MatchingPool, "match_ids", lambda pool, *args: pooled.append(1) or match_ids(pool, *args))
+    headers = {"Authorization": f"Bearer {TOKEN}"}
+    try:
+        assert served_rankings() == rebuilt_rankings()
+        if workers > 1:
+            pool = chat.get_matching_pool(chat.get_matching_engine())
+            deadline = time.monotonic() + 60
+            while not pool.ready:
+                assert time.monotonic() < deadline, "matching pool never became ready"
+                time.sleep(0.05)
+
+        created = {**top("turmeric"), "id": f"test-{workers}-new", "productName": "Fresh Red Onion"}
+        assert client.post("/api/products", json=created, headers=headers).status_code == 201
+        assert served_rankings() == rebuilt_rankings()
+
+        updated = {**top("salt"), "productName": "Basmati Rice Classic"}
+        assert client.put(f"/api/products/{updated['id']}", json=updated, headers=headers).status_code == 200
+        assert served_rankings() == rebuilt_rankings()
+
+        assert client.delete(f"/api/products/{top('tomato')['id']}", headers=headers).status_code == 204
+        assert served_rankings() == rebuilt_rankings()
+
+        changes = {
+            "upsert": [
+                {**created, "id": f"test-{workers}-bulk", "productName": "Organic Turmeric Powder"},
+                {**top("milk"), "productName": "Paneer Fresh"},
+            ],
+            "delete": [top("rice")["id"], created["id"]],
+        }
+        assert client.post("/api/products/bulk", json=changes, headers=headers).status_code == 200
+        assert served_rankings() == rebuilt_rankings()
+        assert bool(pooled) == (workers > 1)
+    finally:
+        if chat._pool is not None:
+            chat._pool.shutdown()
+
+
+def test_reimport_wins_over_earlier_api_writes(client, monkeypatch):
+    import importer
+    from catalog_changes import latest_revision, read_log
+    from database import DATABASE_URL, read_engine
+
+    monkeypatch.setenv("CATALOG_ADMIN_TOKEN", TOKEN)
+    headers = {"Authorization": f"Bearer {TOKEN}"}
+    catalog = get_catalog()
+    edited, deleted = catalog.products[5].to_dict(), catalog.products[6].to_dict()
+    renamed = {**edited, "productName": "Edited Through The API"}
+    assert client.put(f"/api/products/{edited['id']}", json=renamed, headers=headers).status_code == 200
+    assert client.delete(f"/api/products/{deleted['id']}", headers=headers).status_code == 204
+    revision = latest_revision()
+
+    importer.main([str(catalog.source), "--database", DATABASE_URL, "--force"])
+
+    # The log entries were made against the previous import: compacted away, not replayed
+    generation, _, changes = read_log(read_engine)
+    assert changes == []
+    assert latest_revision() == revision
+    listed = {p["id"]: p for p in client.get("/api/products").json()}
+    assert listed[edited["id"]]["productName"] == edited["productName"]
+    assert deleted["id"] in listed
+    reloaded = get_catalog()
+    assert reloaded.generation == generation
+    assert reloaded.by_id[edited["id"]].productName == edited["productName"]
+    assert deleted["id"] in reloaded.by_id
+    assert served_rankings() == rebuilt_rankings()
+
+    # Writes against the new import are logged and replayed as before
+    assert client.put(f"/api/products/{edited['id']}", json=renamed, headers=headers).status_code == 200
+    assert latest_revision() > revision
+    assert get_catalog().by_id[edited["id"]].productName == renamed["productName"]
+    assert load_catalog(catalog.source).by_id[edited["id"]].productName == renamed["productName"]
+    assert served_rankings() == rebuilt_rankings()
+
+
+def test_reader_from_before_a_write_is_not_cached():
+    payloads = ProductPayloads(None)
+    record = get_catalog().products[0]
+    old = product_values(record)
+    new = (old[0], "Renamed Product") + old[2:]
+    stale_reader = payloads.reader()
+
+    payloads.forget([old[0]], revision=1)
+    assert b"Renamed Product" in payloads.reader().encode_rows([new])
+    # A request that read the row before the write still gets its own bytes...
+    assert stale_reader.get(record) == dumps(product_dict(record))
+    # ...but they don't replace the current entry
+    assert payloads._keys[old[0]] == new
+    assert old not in payloads._bytes
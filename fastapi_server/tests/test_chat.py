@@ -0,0 +1,92 @@
+import asyncio
+import json
+import logging
+import uuid
+
+import pytest
+
+import chat
+import llm
+from llm import LLMClient, StubProvider
+
+
+class FailingProvider(StubProvider):
+    """StubProvider that raises for prompts mentioning ``broken`` and hangs for ``slow``."""
+
+    async def generate(self, prompt):
+        if "broken" in prompt:
+            raise RuntimeError("provider exploded")
+        if "slow" in prompt:
+            await asyncio.sleep(10)
+        return await super().generate(prompt)
+
+
+@pytest.fixture
+def provider(monkeypatch):
+    provider = FailingProvider()
+    monkeypatch.setattr(llm, "_client", LLMClient(provider, timeout=0.2))
+    return provider
+
+
+def dish(name):
+    # Fresh dish names so nothing comes from the ingredient cache
+    return f"{name} {uuid.uuid4().hex}"
+
+
+def test_batch_reports_dish_errors_like_chat(client, provider, caplog):
+    messages = [dish("dal"), dish("broken dish"), dish("slow dish")]
+    with caplog.at_level(logging.WARNING, logger="chat"):
+        dishes = client.post("/api/chat/batch", json={"messages": messages}).json()["dishes"]
+    assert dishes[0]["error"] is None and dishes[0]["ingredients"]
+    assert dishes[1] == {
+        "message": messages[1], "ingredients": [], "error": "LangChain Gemini\u00a0error:\u00a0provider exploded",
+    }
+    assert dishes[2]["error"] == "LLM request timed out"
+    # The same details /api/chat answers with
+    assert client.post("/api/chat", json={"message": messages[1]}).json()["detail"] == dishes[1]["error"]
+    assert any("provider exploded" in record.getMessage() for record in caplog.records)
+
+
+def sse_events(response):
+    events = []
+    for block in response.text.strip().split("\n\n"):
+        fields = dict(line.split(": ", 1) for line in block.splitlines())
+        events.append((fields["event"], json.loads(fields["data"])))
+    return events
+
+
+def test_stream_events_end_with_the_chat_response(client, provider):
+    message = dish("paneer butter masala")
+    response = client.post("/api/chat/stream", json={"message": message})
+    assert response.status_code == 200
+    assert response.headers["content-type"].startswith("text/event-stream")
+    events = sse_events(response)
+
+    names = [name for name, _ in events]
+    ingredients = events[0][1]
+    assert names == ["ingredients"] + ["match"] * len(ingredients) + ["done"]
+    matches = {data.pop("index"): data for name, data in events if name == "match"}
+    assert sorted(matches) == list(range(len(ingredients)))
+    assert [matches[i]["ingredient"] for i in range(len(ingredients))] == ingredients
+    done = events[-1][1]
+    assert done["ingredients"] == [matches[i] for i in range(len(ingredients))]
+    # The ingredient list is cached now, so /api/chat answers for the same dish
+    assert client.post("/api/chat", json={"message": message}).json() == done
+
+
+def test_stream_errors_before_the_first_event_are_http_errors(client, provider):
+    response = client.post("/api/chat/stream", json={"message": dish("broken dish")})
+    assert response.status_code == 500
+    assert response.json()["detail"] == "LangChain Gemini\u00a0error:\u00a0provider exploded"
+    assert client.post("/api/chat/stream", json={"message": dish("slow dish")}).status_code == 504
+
+
+def test_stream_matching_failure_ends_with_an_error_event(client, provider, monkeypatch):
+    def fail(ingredients):
+        raise RuntimeError("matching exploded")
+        yield
+
+    monkeypatch.setattr(chat, "stream_ranked_products", fail)
+    events = sse_events(client.post("/api/chat/stream", json={"message": dish("dal")}))
+    assert [name for name, _ in events] == ["ingredients", "error"]
+    assert events[-1][1] == {"detail": "matching exploded"}
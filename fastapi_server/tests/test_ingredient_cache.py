@@ -0,0 +1,68 @@
+import ingredient_cache
+from database import create_engines
+from ingredient_cache import IngredientCache
+
+
+def make_cache(tmp_path, **kwargs):
+    return IngredientCache(*create_engines(f"sqlite:///{tmp_path / 'ingredients.db'}"), **kwargs)
+
+
+def test_memory_is_an_lru_over_the_table(tmp_path):
+    cache = make_cache(tmp_path, max_entries=2)
+    cache.set("dal", ["lentils"])
+    cache.set("poha", ["rice flakes"])
+    assert cache.get("dal") == ["lentils"]
+    cache.set("upma", ["semolina"])
+    # poha was least recently used
+    assert list(cache._memory) == ["dal", "upma"]
+    assert cache.stats()["evictions"] == 1
+    assert cache.get("poha") == ["rice flakes"]
+    assert cache.stats()["disk_hits"] == 1
+    # ...and is promoted back into memory
+    assert list(cache._memory) == ["upma", "poha"]
+
+
+def test_disk_tier_survives_a_restart(tmp_path):
+    make_cache(tmp_path).set("dal", ["lentils", "turmeric"])
+    cache = make_cache(tmp_path)
+    assert cache.get("dal") == ["lentils", "turmeric"]
+    assert cache.get("kheer") is None
+    assert cache.stats()["disk_hits"] == 1
+    assert cache.stats()["misses"] == 1
+
+
+def test_expired_entries_are_misses_in_both_tiers(tmp_path):
+    cache = make_cache(tmp_path)
+    cache.set("dal", ["lentils"], ttl=-1)
+    assert cache.get("dal") is None
+    assert cache.stats()["expirations"] == 1
+    # The expired row was deleted, not just skipped
+    cache.clear_memory()
+    assert cache.get("dal") is None
+    assert cache.stats()["expirations"] == 1
+    cache.set("dal", ["lentils"])
+    assert cache.get("dal") == ["lentils"]
+
+
+def test_table_is_trimmed_least_recently_used_first(tmp_path, monkeypatch):
+    monkeypatch.setattr(ingredient_cache, "PRUNE_EVERY", 3)
+    cache = make_cache(tmp_path, max_rows=2)
+    cache.set("dal", ["lentils"])
+    cache.set("poha", ["rice flakes"])
+    cache.clear_memory()
+    assert cache.get("dal") == ["lentils"]  # now more recently used than poha
+    cache.set("upma", ["semolina"])
+    cache.clear_memory()
+    assert cache.get("poha") is None
+    assert cache.get("dal") == ["lentils"]
+    assert cache.get("upma") == ["semolina"]
+    assert cache.stats()["disk_evictions"] == 1
+
+
+def test_rows_written_before_json_still_decode(tmp_path):
+    cache = make_cache(tmp_path)
+    with cache._write.begin() as conn:
+        conn.exec_driver_sql(
+            "INSERT INTO ingredient_cache (dish_name, ingredients) VALUES (?, ?)", ("dal", str(["lentils"]))
+        )
+    assert cache.get("dal") == ["lentils"]
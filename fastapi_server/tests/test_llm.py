@@ -0,0 +1,61 @@
+import asyncio
+import uuid
+
+import chat
+import llm
+from llm import LLMClient, SingleFlight, StubProvider
+
+
+class CountingProvider(StubProvider):
+    """StubProvider recording how many calls it got and how many overlapped."""
+
+    def __init__(self, latency):
+        super().__init__(latency=latency)
+        self.calls = 0
+        self.active = 0
+        self.peak = 0
+
+    async def generate(self, prompt):
+        self.calls += 1
+        self.active += 1
+        self.peak = max(self.peak, self.active)
+        try:
+            return await super().generate(prompt)
+        finally:
+            self.active -= 1
+
+
+def test_concurrent_identical_prompts_make_one_call(monkeypatch):
+    provider = CountingProvider(latency=0.05)
+    monkeypatch.setattr(llm, "_client", LLMClient(provider))
+    monkeypatch.setattr(chat, "ingredient_flights", SingleFlight())
+    message = f"Paneer Butter Masala {uuid.uuid4().hex}"
+
+    async def ask():
+        return await asyncio.gather(*(chat.resolve_ingredients(message) for _ in range(5)))
+
+    results = asyncio.run(ask())
+    assert provider.calls == 1
+    assert all(result == results[0] for result in results)
+    assert (chat.ingredient_flights.leaders, chat.ingredient_flights.followers) == (1, 4)
+
+
+def test_concurrency_is_bounded():
+    provider = CountingProvider(latency=0.02)
+    client = LLMClient(provider, max_concurrency=2)
+
+    async def ask():
+        return await asyncio.gather(*(client.generate(f"dish {i}") for i in range(6)))
+
+    assert len(asyncio.run(ask())) == 6
+    assert provider.calls == 6
+    assert provider.peak == 2
+
+
+def test_provider_timeout_is_a_504(client, monkeypatch):
+    slow = LLMClient(StubProvider(latency=5), timeout=0.05)
+    monkeypatch.setattr(llm, "_client", slow)
+    response = client.post("/api/chat", json={"message": f"biryani {uuid.uuid4().hex}"})
+    assert response.status_code == 504
+    assert response.json()["detail"] == "LLM request timed out"
+    assert slow.stats()["timeouts"] == 1
@@ -0,0 +1,31 @@
+from database import create_engines
+from match_store import MatchStore
+
+
+def make_store(tmp_path, **kwargs):
+    return MatchStore(*create_engines(f"sqlite:///{tmp_path / 'matches.db'}"), **kwargs)
+
+
+def test_memory_is_bounded_and_falls_back_to_the_table(tmp_path):
+    store = make_store(tmp_path, max_entries=2)
+    store.put_many("v1", {"salt": ["1"], "onion": ["2"], "oil": ["3"]})
+    assert list(store._memory) == ["onion", "oil"]
+    assert store.stats()["evictions"] == 1
+    assert store.get_many("v1", ["salt", "onion", "ghee"]) == {"salt": ["1"], "onion": ["2"]}
+    assert len(store._memory) == 2
+
+
+def test_new_version_drops_old_rankings(tmp_path):
+    store = make_store(tmp_path)
+    store.put_many("v1", {"salt": ["1"]})
+    assert store.get_many("v2", ["salt"]) == {}
+    assert store.get_many("v1", ["salt"]) == {}
+
+
+def test_older_revisions_need_confirmation(tmp_path):
+    store = make_store(tmp_path)
+    store.put_many("v1", {"salt": ["1"], "onion": ["2"]}, revision=3)
+    unchanged = lambda ingredient, product_ids, revision: ingredient == "salt"  # noqa: E731
+    assert store.get_many("v1", ["salt", "onion"], revision=5, unchanged=unchanged) == {"salt": ["1"]}
+    # Re-stamped at the caller's revision, so no confirmation is needed any more
+    assert store.get_many("v1", ["salt"], revision=5) == {"salt": ["1"]}
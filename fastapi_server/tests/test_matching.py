@@ -0,0 +1,69 @@
+import pytest
+
+from catalog import get_catalog
+from chat import smart_ingredient_matching
+from matching import MAX_MATCHES, build_matching_engine, get_ingredient_synonyms
+
+# Synonym keys plus inputs the engine's index shortcuts could get wrong
+INGREDIENTS = list(get_ingredient_synonyms()) + [
+    "", " ", "c++", "e", "co", "oil", "Onion ", "  SALT", "red  chili", "(salt)", "a-b", "tel", "fresh",
+    "masala", "green chilli", "basmati rice", "chicken breast boneless", "food colour - red", "xyz",
+]
+
+
+@pytest.fixture(scope="module")
+def catalog():
+    return get_catalog()
+
+
+@pytest.mark.parametrize("backend", ["python", "numpy"])
+def test_engine_matches_reference(catalog, backend):
+    engine = build_matching_engine(catalog.products, version=catalog.version, backend=backend)
+    products = [product.to_dict() for product in catalog.products]
+    for ingredient in INGREDIENTS:
+        expected = [product["id"] for product in smart_ingredient_matching(ingredient, products)]
+        assert [engine.products[i].id for i in engine.match_indices(ingredient)] == expected, ingredient
+
+
+@pytest.mark.parametrize("backend", ["python", "numpy"])
+def test_ranked_indices_tops_up_only_when_short(catalog, backend):
+    engine = build_matching_engine(catalog.products, version=catalog.version, backend=backend)
+    # Exact matching already fills the limit: no spelling correction is mixed in
+    for ingredient in ["onion", "rice", "salt", "tomato", "milk"]:
+        assert len(engine.match_indices(ingredient)) == MAX_MATCHES
+        assert engine.ranked_indices(ingredient) == engine.match_indices(ingredient), ingredient
+
+    # Misspellings match nothing exactly and are filled from the correction
+    for ingredient, corrected in [("red chili powder", "red chilli powder"), ("tumeric", "turmeric")]:
+        assert engine.match_indices(ingredient) == []
+        assert engine.terms.correct(ingredient) == corrected
+        ranked = engine.ranked_indices(ingredient)
+        assert len(ranked) == MAX_MATCHES
+        assert ranked == engine.match_indices(corrected), ingredient
+
+    # Short results with nothing to correct are left as they are
+    found = engine.match_indices("onion", limit=1000)
+    assert len(found) < 1000
+    assert engine.ranked_indices("onion", limit=1000) == found
+
+
+@pytest.mark.parametrize("backend", ["python", "numpy"])
+def test_apply_changes_leaves_old_engine_caches_alone(catalog, backend, monkeypatch):
+    engine = build_matching_engine(catalog.products, version=catalog.version, backend=backend)
+    engine.match_indices("onion")
+    caches = [name for name in ("_candidate_cache", "_variation_scores") if hasattr(engine, name)]
+    shared = []
+    changed = type(engine)._changed
+
+    def spy(self, removed, added):
+        # Readers still on the old engine keep caching into its dicts while these are filtered
+        shared.extend(name for name in caches if getattr(self, name) is getattr(engine, name))
+        return changed(self, removed, added)
+
+    monkeypatch.setattr(type(engine), "_changed", spy)
+    old = catalog.products[0]
+    renamed = type(old).from_dict({**old.to_dict(), "productName": "Red Onion Fresh"})
+    updated = engine.apply_changes([(old, renamed)], engine.revision + 1)
+    assert shared == []
+    engine.match_indices("turmeric")
+    assert "turmeric" not in updated._candidate_cache
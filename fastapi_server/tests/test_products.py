@@ -0,0 +1,59 @@
+import json
+
+import pytest
+
+
+def ndjson(response):
+    return [json.loads(line) for line in response.text.splitlines()]
+
+
+@pytest.mark.parametrize("path", ["/api/products", "/api/products/category/Beverages"])
+@pytest.mark.parametrize("sort", ["price", "discount", "discount_pct"])
+def test_stream_keeps_sort_order(client, path, sort):
+    paged, after = [], None
+    while True:
+        response = client.get(path, params={"sort": sort, "limit": 250, **({"after": after} if after else {})})
+        paged += [product["id"] for product in response.json()]
+        after = response.headers.get("X-Next-Cursor")
+        if after is None:
+            break
+    streamed = ndjson(client.get(path, params={"sort": sort, "stream": "true"}))
+    assert [product["id"] for product in streamed] == paged
+
+
+@pytest.mark.parametrize("params", [{"limit": 10}, {"after": "0"}])
+def test_stream_rejects_paging(client, params):
+    assert client.get("/api/products", params={"stream": "true", **params}).status_code == 400
+
+
+def test_import_is_served_fresh(client, tmp_path):
+    import csv
+
+    import importer
+    from catalog import find_catalog_csv
+    from database import DATABASE_URL
+
+    with open(find_catalog_csv(), newline="", encoding="utf-8") as f:
+        rows = list(csv.DictReader(f))
+    product_id = rows[0]["ProductID"]
+    first = client.get("/api/products")
+    assert first.json()[[p["id"] for p in first.json()].index(product_id)]["productName"] != "Renamed Product"
+
+    rows[0]["ProductName"] = "Renamed Product"
+    other = tmp_path / "other.csv"
+    with open(other, "w", newline="", encoding="utf-8") as f:
+        writer = csv.DictWriter(f, fieldnames=list(rows[0]))
+        writer.writeheader()
+        writer.writerows(rows)
+    importer.main([str(other), "--database", DATABASE_URL])
+
+    assert client.get("/api/products", headers={"If-None-Match": first.headers["ETag"]}).status_code == 200
+    category = client.get(f"/api/products/category/{rows[0]['Category']}")
+    for response in (client.get("/api/products"), category):
+        assert {p["id"]: p["productName"] for p in response.json()}[product_id] == "Renamed Product"
+    # The in-memory catalog still holds the configured file's record: it must not share the row's bytes
+    from catalog import get_catalog
+    from serialization import get_product_payloads
+
+    record = get_catalog().by_id[product_id]
+    assert json.loads(get_product_payloads().get(record))["productName"] == record.productName
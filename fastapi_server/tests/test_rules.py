@@ -0,0 +1,34 @@
+import json
+
+import pytest
+
+import rules
+
+
+@pytest.fixture
+def rules_file(tmp_path, monkeypatch):
+    path = tmp_path / "matching_rules.json"
+    path.write_bytes(rules.RULES_PATH.read_bytes())
+    monkeypatch.setattr(rules, "RULES_PATH", path)
+    monkeypatch.setattr(rules, "_rules", None)
+    monkeypatch.setattr(rules, "_signature", None)
+    return path
+
+
+def test_missing_file_keeps_previous_rules(rules_file):
+    loaded = rules.get_rules()
+    data = json.loads(rules_file.read_text())
+    rules_file.unlink()
+    assert rules.get_rules() is loaded
+    assert rules.get_rules() is loaded
+
+    data["exclude_keywords"].append("zzz-test-keyword")
+    rules_file.write_text(json.dumps(data))
+    reloaded = rules.get_rules()
+    assert reloaded.version != loaded.version
+
+
+def test_missing_file_without_rules_raises(rules_file):
+    rules_file.unlink()
+    with pytest.raises(OSError):
+        rules.get_rules()
@@ -0,0 +1,233 @@
+import re
+from collections import defaultdict
+
+import numpy as np
+
+from matching import MAX_MATCHES, MatchingEngine, compile_variation, simple_tokenize
+
+
+WORD_RUN = re.compile(r"\w+")
+# Product x key postings, in the order posting_keys returns their keys
+POSTINGS = (
+    "name_word_rows", "brand_word_rows", "name_run_rows", "brand_run_rows",
+    "name_first_rows", "brand_first_rows", "name_exact_rows", "brand_exact_rows",
+)
+
+
+def postings_arrays(postings):
+    return {key: np.array(rows, dtype=np.int64) for key, rows in postings.items()}
+
+
+def posting_keys(name, brand, words):
+    # startswith(variation + " ") needs a literal space after the first word
+    return (
+        set(words), set(brand.split()), set(WORD_RUN.findall(name)), set(WORD_RUN.findall(brand)),
+        (name.partition(" ")[0],) if " " in name else (), (brand.partition(" ")[0],) if " " in brand else (),
+        (name,), (brand,),
+    )
+
+
+class VectorMatchingEngine(MatchingEngine):
+    """MatchingEngine that scores every product for a variation with numpy.
+
+    Every string test in the reference formula is answered from sparse
+    product x token structures built once per catalog: name/brand words for
+    substring tests (a whitespace-free variation is inside a name exactly
+    when it is inside one of its words, so only the vocabulary is scanned),
+    ``\w+`` runs for word-boundary matches, first words for prefixes, and
+    whole names/brands for equality. Keyword, category and word-count
+    checks are boolean columns and the similarity term is a CSR
+    product x token matrix product. Multi-word variations fall back to
+    string tests on their (small) candidate set.
+
+    Scores are built in the same order of floating-point additions as
+    ``MatchingEngine.match_indices``, so they, and the rankings, are identical.
+    """
+
+    def __init__(self, products, version=None, rules=None, revision=0):
+        super().__init__(products, version, rules, revision)
+        postings = {attribute: defaultdict(list) for attribute in POSTINGS}
+        for i, (name, brand, words) in enumerate(zip(self.names, self.brands, self.name_words)):
+            for attribute, keys in zip(POSTINGS, posting_keys(name, brand, words)):
+                for key in keys:
+                    postings[attribute][key].append(i)
+        for attribute, rows in postings.items():
+            setattr(self, attribute, postings_arrays(rows))
+
+        self.excluded_column = np.array(self.excluded, dtype=bool)
+        self.preferred_category_column = np.array(self.preferred_category, dtype=bool)
+        self.preferred_keyword_column = np.array(self.preferred_keyword, dtype=bool)
+        word_counts = np.array([len(words) for words in self.name_words], dtype=np.int64)
+        self.too_long = word_counts > 6
+        self.long_name = word_counts > 4
+        self.short_name = word_counts <= 3
+
+        vocabulary = {}
+        indptr = [0]
+        indices = []
+        for tokens in self.name_tokens:
+            indices.extend(vocabulary.setdefault(token, len(vocabulary)) for token in tokens)
+            indptr.append(len(indices))
+        self.token_ids = vocabulary
+        # Row i's tokens are token_indices[token_starts[i]:token_starts[i] + token_counts[i]];
+        # updated rows are appended at the end rather than rewritten in place
+        self.token_starts = np.array(indptr[:-1], dtype=np.int64)
+        self.token_indices = np.array(indices, dtype=np.int64)
+        self.token_counts = np.diff(np.array(indptr, dtype=np.int64))
+        self._variation_scores = {}
+
+    def _copy_for_update(self):
+        super()._copy_for_update()
+        for attribute in POSTINGS:
+            setattr(self, attribute, dict(getattr(self, attribute)))
+        self.token_ids = dict(self.token_ids)
+        self._variation_scores = dict(self._variation_scores)
+        self._updated_rows = []
+
+    def _index(self, i):
+        super()._index(i)
+        for attribute, keys in zip(POSTINGS, posting_keys(self.names[i], self.brands[i], self.name_words[i])):
+            postings = getattr(self, attribute)
+            for key in keys:
+                rows = postings.get(key)
+                postings[key] = np.array([i], dtype=np.int64) if rows is None else np.append(rows, i)
+        self._updated_rows.append(i)
+
+    def _unindex(self, i):
+        super()._unindex(i)
+        for attribute, keys in zip(POSTINGS, posting_keys(self.names[i], self.brands[i], self.name_words[i])):
+            postings = getattr(self, attribute)
+            for key in keys:
+                rows = postings[key][postings[key] != i]
+                if len(rows):
+                    postings[key] = rows
+                else:
+                    del postings[key]
+
+    def _changed(self, removed, added):
+        super()._changed(removed, added)
+        texts = self.history[-1][1]
+        self._variation_scores = {
+            variation: scores for variation, scores in self._variation_scores.items()
+            if not any(variation in text for text in texts)
+        }
+        size = len(self.products)
+        rows = np.array(sorted(set(self._updated_rows)), dtype=np.int64)
+        del self._updated_rows
+
+        def column(array, values, dtype):
+            array = np.concatenate([array, np.zeros(size - len(array), dtype=dtype)])
+            array[rows] = np.array(values, dtype=dtype)
+            return array
+
+        self.excluded_column = column(self.excluded_column, [self.excluded[i] for i in rows], bool)
+        self.preferred_category_column = column(
+            self.preferred_category_column, [self.preferred_category[i] for i in rows], bool
+        )
+        self.preferred_keyword_column = column(
+            self.preferred_keyword_column, [self.preferred_keyword[i] for i in rows], bool
+        )
+        word_counts = np.array([len(self.name_words[i]) for i in rows], dtype=np.int64)
+        self.too_long = column(self.too_long, word_counts > 6, bool)
+        self.long_name = column(self.long_name, word_counts > 4, bool)
+        self.short_name = column(self.short_name, word_counts <= 3, bool)
+
+        indices = [
+            self.token_ids.setdefault(token, len(self.token_ids)) for i in rows for token in self.name_tokens[i]
+        ]
+        counts = np.array([len(self.name_tokens[i]) for i in rows], dtype=np.int64)
+        self.token_starts = column(self.token_starts, len(self.token_indices) + np.cumsum(counts) - counts, np.int64)
+        self.token_counts = column(self.token_counts, counts, np.int64)
+        self.token_indices = np.concatenate([self.token_indices, np.array(indices, dtype=np.int64)])
+
+    def _mask(self, *row_arrays):
+        mask = np.zeros(len(self.products), dtype=bool)
+        for rows in row_arrays:
+            if rows is not None:
+                mask[rows] = True
+        return mask
+
+    def _rows_with_word(self, word_rows, test):
+        # Vocabulary scan: products having some word that passes ``test``
+        return self._mask(*(rows for word, rows in word_rows.items() if test(word)))
+
+    def _rows_where(self, rows, values, test):
+        return self._mask(np.array([i for i in rows if test(values[i])], dtype=np.int64))
+
+    def variation_scores(self, variation):
+        """(rows, base scores, rows whose name contains ``variation``) for one variation."""
+        cached = self._variation_scores.get(variation)
+        if cached is not None:
+            return cached
+        if not any(char.isspace() for char in variation):
+            in_name = self._rows_with_word(self.name_word_rows, lambda word: variation in word)
+            in_brand = self._rows_with_word(self.brand_word_rows, lambda word: variation in word)
+            starts = self._mask(self.name_first_rows.get(variation), self.brand_first_rows.get(variation))
+        else:
+            candidates = self.candidates(variation)
+            in_name = self._rows_where(candidates, self.names, lambda name: variation in name)
+            in_brand = self._rows_where(candidates, self.brands, lambda brand: variation in brand)
+            prefix = variation + " "
+            starts = self._rows_where(candidates, self.names, lambda name: name.startswith(prefix))
+            starts |= self._rows_where(candidates, self.brands, lambda brand: brand.startswith(prefix))
+        if WORD_RUN.fullmatch(variation):
+            word_in_name = self._mask(self.name_run_rows.get(variation))
+            word_in_brand = self._mask(self.brand_run_rows.get(variation))
+        else:
+            pattern = compile_variation(variation)
+            word_in_name = self._rows_where(np.flatnonzero(in_name), self.names, pattern.search)
+            word_in_brand = self._rows_where(np.flatnonzero(in_brand), self.brands, pattern.search)
+        equal = self._mask(self.name_exact_rows.get(variation), self.brand_exact_rows.get(variation))
+
+        score = np.where(in_name, np.where(self.long_name, 60, 70), np.where(in_brand, 45, 0))
+        score = np.maximum(score, np.where(starts, 75, 0))
+        score = np.maximum(score, np.where(word_in_name, 85, np.where(word_in_brand, 80, 0)))
+        score[equal] = 100
+        rows = np.flatnonzero(score)
+        result = self._variation_scores[variation] = (rows, score[rows], np.flatnonzero(in_name))
+        return result
+
+    def similarity(self, rows, ingredient_tokens):
+        """Jaccard over name tokens, as MatchingEngine._similarity, for many rows at once."""
+        if not ingredient_tokens or not len(rows):
+            return np.zeros(len(rows))
+        token_ids = [self.token_ids[token] for token in ingredient_tokens if token in self.token_ids]
+        lengths = self.token_counts[rows]
+        overlap = np.zeros(len(rows), dtype=np.int64)
+        if token_ids and lengths.sum():
+            # CSR rows x indicator vector of the ingredient's tokens
+            offsets = np.repeat(self.token_starts[rows] - np.cumsum(lengths) + lengths, lengths)
+            columns = self.token_indices[np.arange(int(lengths.sum())) + offsets]
+            hits = np.isin(columns, token_ids)
+            overlap = np.bincount(np.repeat(np.arange(len(rows)), lengths)[hits], minlength=len(rows))
+        union = len(ingredient_tokens) + lengths - overlap
+        return np.divide(overlap, union, out=np.zeros(len(rows)), where=lengths > 0)
+
+    def match_indices(self, ingredient, limit=MAX_MATCHES):
+        norm_ingredient = ingredient.strip().lower()
+        if not norm_ingredient or norm_ingredient == "food coloring":
+            return super().match_indices(ingredient, limit)
+        variations = self.variations(norm_ingredient)
+
+        base = np.zeros(len(self.products), dtype=np.int64)
+        in_any_name = np.zeros(len(self.products), dtype=bool)
+        for variation in variations:
+            rows, scores, name_rows = self.variation_scores(variation)
+            base[rows] = np.maximum(base[rows], scores)
+            in_any_name[name_rows] = True
+        if not any(char.isspace() for char in norm_ingredient):
+            word_start = self._rows_with_word(self.name_word_rows, lambda word: word.startswith(norm_ingredient))
+            base[word_start] = np.maximum(base[word_start], 60)
+
+        rows = np.flatnonzero(base)
+        rows = rows[in_any_name[rows] | ~(self.excluded_column[rows] | self.too_long[rows])]
+        # Same addition order as the reference so float results are bit-identical
+        total = base[rows].astype(np.float64)
+        total = total + np.where(self.preferred_category_column[rows], 15, 0)
+        total = total + self.similarity(rows, set(simple_tokenize(norm_ingredient))) * 25
+        total = total + np.where(self.preferred_keyword_column[rows], 20, 0)
+        total = total + np.where(self.short_name[rows], 10, 0)
+
+        selected = np.flatnonzero(total >= 50)
+        order = np.argsort(-total[selected], kind="stable")[:limit]
+        return rows[selected[order]].tolist()